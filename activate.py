@@ -5,7 +5,10 @@ Simulates customer data generation from source systems (CRM)
 
 import sqlite3
 import random
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
+
+from transformation import tune_connection
 
 # Install: pip install faker
 try:
@@ -17,6 +20,12 @@ except ImportError:
 
 fake = Faker('nl_NL')  # Dutch locale for realistic data
 
+# Bulk mode
+DEFAULT_BULK_BATCH_SIZE = 100000
+DEFAULT_POOL_SIZE = 2000
+DEFAULT_DUPLICATE_RATE = 0.05
+DUPLICATE_KINDS = ('typo', 'case', 'swap')
+
 def generate_customer_data(num_customers=100):
     print("=" * 60)
     print("GlobalFin Customer 360 - Data Activation")
@@ -89,15 +98,141 @@ def generate_customer_data(num_customers=100):
         print(f"  • {sample[0]} {sample[1]} ({sample[2]}) - Age: {sample[3]}")
     print()
 
+def sample_pools(size=DEFAULT_POOL_SIZE, seed=None):
+    """Sample name, street and city pools from Faker once"""
+    if seed is not None:
+        Faker.seed(seed)
+    return {
+        'first_names': [fake.first_name() for _ in range(size)],
+        'last_names': [fake.last_name() for _ in range(size)],
+        'streets': [fake.street_name() for _ in range(size)],
+        'cities': [fake.city() for _ in range(size)],
+    }
+
+def add_typo(name, rng):
+    """Drop, double, swap or replace one character"""
+    if len(name) < 3:
+        return name + name[-1:]
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    if kind == 2:
+        return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+    return name[:i] + rng.choice('aeioulnrst') + name[i + 1:]
+
+def near_duplicate(row, rng):
+    """Copy of a CRM row with a realistic data-entry variation (new email)"""
+    first_name, last_name, _, phone, age, address, city = row
+    kind = rng.choice(DUPLICATE_KINDS)
+    if kind == 'typo':
+        if rng.random() < 0.5:
+            first_name = add_typo(first_name, rng)
+        else:
+            last_name = add_typo(last_name, rng)
+    elif kind == 'case':
+        first_name, last_name = (first_name.upper(), last_name.upper()) if rng.random() < 0.5 \
+            else (first_name.lower(), last_name.lower())
+    else:
+        first_name, last_name = last_name, first_name
+    return first_name, last_name, phone, age, address, city
+
+def make_email(first_name, last_name, serial):
+    """Unique by construction: the serial is the row's position in the table"""
+    local = f"{first_name}.{last_name}".lower().replace(' ', '')
+    return f"{local}{serial}@example.com"
+
+def build_batch(count, start, pools, rng, duplicate_rate=DEFAULT_DUPLICATE_RATE):
+    """Build ``count`` crm_customers rows; returns (rows, near-duplicates injected)"""
+    first_names = rng.choices(pools['first_names'], k=count)
+    last_names = rng.choices(pools['last_names'], k=count)
+    streets = rng.choices(pools['streets'], k=count)
+    cities = rng.choices(pools['cities'], k=count)
+    ages = [rng.randint(18, 75) for _ in range(count)]
+    house_numbers = [rng.randint(1, 250) for _ in range(count)]
+    phones = [f"06-{rng.randrange(10 ** 8):08d}" for _ in range(count)]
+
+    rows = []
+    duplicates = 0
+    for i in range(count):
+        serial = start + i
+        if rows and rng.random() < duplicate_rate:
+            first_name, last_name, phone, age, address, city = near_duplicate(rng.choice(rows), rng)
+            duplicates += 1
+        else:
+            first_name, last_name, phone, age = first_names[i], last_names[i], phones[i], ages[i]
+            address, city = f"{streets[i]} {house_numbers[i]}", cities[i]
+        rows.append((first_name, last_name, make_email(first_name, last_name, serial),
+                     phone, age, address, city))
+    return rows, duplicates
+
+def generate_customer_data_bulk(num_customers=100000, seed=None, duplicate_rate=DEFAULT_DUPLICATE_RATE,
+                                batch_size=DEFAULT_BULK_BATCH_SIZE):
+    """Bulk generator for load testing.
+
+    Faker is only used to fill the value pools; rows are drawn from them with
+    a seeded RNG, so the same seed gives the same data. ``duplicate_rate`` of
+    the rows are near-duplicates (typo, case change or swapped names) of an
+    earlier row in the same batch.
+    """
+    print("=" * 60)
+    print("GlobalFin Customer 360 - Data Activation (bulk)")
+    print("=" * 60)
+    print()
+    print(f"Generating {num_customers} synthetic customer records "
+          f"({duplicate_rate:.0%} near-duplicates, seed {seed})...")
+    print()
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    pools = sample_pools(seed=seed)
+
+    conn = sqlite3.connect('source-systems.db')
+    tune_connection(conn)
+    # Emails embed the row serial; start after any rows already present
+    start = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM crm_customers").fetchone()[0]
+    inserted = 0
+    duplicates = 0
+    while inserted < num_customers:
+        count = min(batch_size, num_customers - inserted)
+        rows, batch_duplicates = build_batch(count, start + inserted, pools, rng, duplicate_rate)
+        with conn:
+            conn.executemany('''INSERT INTO crm_customers
+                                (first_name, last_name, email, phone, age, address, city)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+        inserted += count
+        duplicates += batch_duplicates
+        print(f"   ✓ Generated {inserted}/{num_customers} customers...")
+
+    with conn:
+        conn.execute('''INSERT INTO source_metadata (source_name, last_sync, record_count)
+                        VALUES (?, ?, ?)''', ('CRM_Salesforce', datetime.now(), inserted))
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    print()
+    print("=" * 60)
+    print(f"✅ Successfully generated {inserted} customer records "
+          f"({duplicates} near-duplicates) in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/sec)")
+    print("=" * 60)
+    print()
+
 if __name__ == "__main__":
-    import sys
+    import argparse
     
-    num = 100
-    if len(sys.argv) > 1:
-        try:
-            num = int(sys.argv[1])
-        except:
-            print("Usage: python activate.py [number_of_customers]")
-            sys.exit(1)
+    parser = argparse.ArgumentParser(description="GlobalFin synthetic CRM data generator")
+    parser.add_argument('num_customers', nargs='?', type=int, default=100)
+    parser.add_argument('--bulk', action='store_true', help="fast batched generator for load testing")
+    parser.add_argument('--seed', type=int, default=None, help="bulk mode: RNG seed for reproducible data")
+    parser.add_argument('--duplicate-rate', type=float, default=DEFAULT_DUPLICATE_RATE,
+                        help="bulk mode: fraction of near-duplicate rows")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BULK_BATCH_SIZE,
+                        help="bulk mode: rows per transaction")
+    args = parser.parse_args()
     
-    generate_customer_data(num)
+    if args.bulk:
+        generate_customer_data_bulk(args.num_customers, args.seed, args.duplicate_rate, args.batch_size)
+    else:
+        generate_customer_data(args.num_customers)
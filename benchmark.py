@@ -0,0 +1,247 @@
+"""
+GlobalFin Customer 360 Platform - Pipeline Benchmark
+Times every pipeline stage at N synthetic customers and writes JSON results
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+DEFAULT_SIZES = '10k,100k,1M'
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DB_FILES = ['source-systems.db', 'mdm.db', 'cdp.db', 'datawarehouse.db', 'cjop.db']
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+def count_rows(db_path, table):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+# Stage functions run inside the child process, in the run directory
+def _activate(options):
+    from activate import generate_customer_data_bulk
+    generate_customer_data_bulk(options['customers'], seed=0)
+    return count_rows('source-systems.db', 'crm_customers')
+
+def _transform(options):
+    from transformation import transform_source_to_mdm
+    transform_source_to_mdm(workers=options['workers'], engine=options['transform_engine'])
+    return count_rows('mdm.db', 'golden_records')
+
+def _match(options):
+    from matching import match_duplicates
+    match_duplicates(workers=options['workers'])
+    return count_rows('mdm.db', 'golden_records')
+
+def _cluster(options):
+    from clustering import cluster_duplicates
+    cluster_duplicates()
+    return count_rows('mdm.db', 'match_history')
+
+def _sync(options):
+    from safecdpdata import sync_mdm_to_cdp
+    sync_mdm_to_cdp(engine=options['engine'], seed=0)
+    return count_rows('cdp.db', 'customer_profiles')
+
+def _orchestrate(options):
+    import cjop
+    cjop.GEMINI_API_URL = options['llm_url']
+    limit = options['orchestration_rows']
+    customer_ids = list(range(1, limit + 1)) if limit else None
+    cjop.orchestrate_batch(customer_ids=customer_ids, concurrency=options['concurrency'],
+                           rate_limit=options['rate_limit'], template_mode=True)
+    return count_rows('cjop.db', 'interactions')
+
+STAGES = [
+    ('activation', _activate),
+    ('transformation', _transform),
+    ('matching', _match),
+    ('clustering', _cluster),
+    ('cdp_sync', _sync),
+    ('orchestration', _orchestrate),
+]
+
+def read_proc_io():
+    """Process I/O counters from /proc (Linux only; None elsewhere)"""
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f)}
+    except OSError:
+        return None
+
+def peak_rss_mb(who):
+    import resource
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def db_bytes():
+    return sum(os.path.getsize(path) for name in DB_FILES for path in (name, f"{name}-wal")
+               if os.path.exists(path))
+
+def _run_stage_in_child(func, options, log_path, results):
+    import resource
+    with open(log_path, 'a') as log, redirect_stdout(log):
+        io_before = read_proc_io()
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        try:
+            rows = func(options)
+            error = None
+        except BaseException as e:
+            rows, error = 0, f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        io_after = read_proc_io()
+    result = {
+        'status': 'failed' if error else 'completed',
+        'rows': rows,
+        'wall_seconds': round(elapsed, 3),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime - usage_before.ru_utime - usage_before.ru_stime
+                             + children.ru_utime + children.ru_stime, 3),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF),
+        'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'db_bytes': db_bytes(),
+    }
+    if io_before and io_after:
+        # read_bytes/write_bytes hit storage; rchar/wchar include the page cache
+        result['io'] = {key: io_after[key] - io_before[key]
+                        for key in ('read_bytes', 'write_bytes', 'rchar', 'wchar', 'syscr', 'syscw')}
+    if error:
+        result['error'] = error
+    results.put(result)
+
+def run_stage(func, options, log_path):
+    """Run a stage in a fresh process, so peak RSS and I/O are its own"""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_stage_in_child, args=(func, options, log_path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def run_size(customers, options, base_dir):
+    """Benchmark one N in its own directory of fresh databases"""
+    run_dir = os.path.join(base_dir, f"n{customers}")
+    os.makedirs(run_dir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(run_dir)
+    try:
+        for name in DB_FILES:
+            for path in (name, f"{name}-wal", f"{name}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        from setup_databases import create_databases
+        with open('benchmark.log', 'w') as log, redirect_stdout(log):
+            create_databases()
+
+        stages = {}
+        for name, func in STAGES:
+            print(f"   • N={customers:,} {name}...", end=' ', flush=True)
+            result = run_stage(func, {**options, 'customers': customers}, 'benchmark.log')
+            stages[name] = result
+            if result['status'] == 'failed':
+                print(f"❌ {result['error']}")
+                break
+            print(f"{result['wall_seconds']:.2f}s ({result['rows_per_sec'] or 0:,.0f} rows/sec, "
+                  f"peak {result['peak_rss_mb']:.0f} MB)")
+        return {'customers': customers, 'stages': stages}
+    finally:
+        os.chdir(cwd)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline):
+    """Print rows/sec change per stage against an earlier results file"""
+    previous = {(run['customers'], name): stage
+                for run in baseline['runs'] for name, stage in run['stages'].items()}
+    print()
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:")
+    for run in results['runs']:
+        for name, stage in run['stages'].items():
+            before = previous.get((run['customers'], name))
+            if not before or not before.get('rows_per_sec') or not stage.get('rows_per_sec'):
+                continue
+            change = stage['rows_per_sec'] / before['rows_per_sec'] - 1
+            print(f"  • N={run['customers']:,} {name:<15} {change:+.1%} rows/sec")
+
+if __name__ == "__main__":
+    import argparse
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Benchmark the GlobalFin pipeline at scale")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma-separated customer counts (10k, 1M, ...)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--transform-engine', default='python', choices=['python', 'sql'])
+    parser.add_argument('--engine', default='vectorized', choices=['scalar', 'vectorized', 'sql'],
+                        help="CDP sync enrichment engine")
+    parser.add_argument('--orchestration-rows', type=int, default=0,
+                        help="orchestrate only the first N customers (0 = all)")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="stub LLM seconds per response")
+    parser.add_argument('--llm-error-rate', type=float, default=0.01, help="stub LLM fraction of 429s")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rate-limit', type=float, default=500.0)
+    parser.add_argument('--work-dir', default='benchmark_runs', help="where the per-N databases are created")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help="earlier results file to compare rows/sec against")
+    args = parser.parse_args()
+
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    except ValueError:
+        parser.error("--sizes must be a comma-separated list such as 10k,100k,1M")
+
+    from stub_llm_server import start_stub_server
+
+    print("=" * 60)
+    print("GlobalFin Customer 360 - Pipeline Benchmark")
+    print("=" * 60)
+    print()
+
+    server, url = start_stub_server(latency=args.llm_latency, error_rate=args.llm_error_rate)
+    options = {'workers': args.workers, 'transform_engine': args.transform_engine,
+               'engine': args.engine, 'llm_url': url,
+               'orchestration_rows': args.orchestration_rows,
+               'concurrency': args.concurrency, 'rate_limit': args.rate_limit}
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in options.items() if key != 'llm_url'},
+        'stub_llm': {'latency': args.llm_latency, 'error_rate': args.llm_error_rate},
+        'runs': [],
+    }
+    for customers in sizes:
+        results['runs'].append(run_size(customers, options, os.path.abspath(args.work_dir)))
+    server.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print()
+    print(f"✅ Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    print()
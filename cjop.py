@@ -3,40 +3,64 @@ GlobalFin Customer 360 Platform - CJOP Orchestration
 Customer Journey Orchestration Platform with AI integration
 """
 
-import sqlite3
+import asyncio
+import os
+import random
 import requests
 import json
-from datetime import datetime
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-GEMINI_API_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent'
+import instrumentation
+from message_cache import NAME_PLACEHOLDER, MessageCache, age_band, cache_key, fill_template
+from profile_lookup import ProfileCache, ProfileLookup
+from segmentation import compile_rules, load_rules, lookup
+
+GEMINI_API_URL = os.environ.get(
+    'GEMINI_API_URL', 'https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent')
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'maxOutputTokens': 250,
+    'topP': 0.8,
+    'topK': 40
+}
+DEFAULT_BATCH_SIZE = 500
+
+# Async generation backend
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RATE_LIMIT = 10.0  # requests per second
+DEFAULT_MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BATCH_STAGES = ['Profile query', 'Channel & campaign', 'Message generation', 'Interaction logging']
+
+INSERT_INTERACTION = '''INSERT INTO interactions 
+                        (customer_id, customer_age, customer_segment, channel, 
+                         campaign_name, personalized_message, ai_model_used)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)'''
+
+# Long-lived, pooled CDP read connections behind a hot profile cache
+# (see profile_lookup.py)
+_profile_lookup = None
+
+def get_profile_lookup():
+    """Shared cached ProfileLookup, opened on first use"""
+    global _profile_lookup
+    if _profile_lookup is None:
+        _profile_lookup = ProfileCache(ProfileLookup('cdp.db'))
+    return _profile_lookup
 
 def get_customer_profile(age):
     """Retrieve customer profile from CDP based on age"""
-    conn = sqlite3.connect('cdp.db')
-    c = conn.cursor()
-    c.execute('''SELECT customer_id, first_name, last_name, email, segment, 
-                        lifetime_value, risk_score 
-                 FROM customer_profiles 
-                 WHERE age = ? 
-                 LIMIT 1''', (age,))
-    profile = c.fetchone()
-    conn.close()
-    
-    if profile:
-        return {
-            'customer_id': profile[0],
-            'first_name': profile[1],
-            'last_name': profile[2],
-            'email': profile[3],
-            'segment': profile[4],
-            'ltv': profile[5],
-            'risk_score': profile[6]
-        }
-    return None
-
-def generate_ai_message(first_name, age, segment, ltv, risk_score):
-    """Generate personalized message using Gemini API"""
-    prompt = f"""You are a professional banking relationship manager at GlobalFin, a premium financial institution.
+    return get_profile_lookup().by_age(age)
+
+def build_prompt(first_name, age, segment, ltv, risk_score):
+    """Prompt for a personalized welcome message"""
+    return f"""You are a professional banking relationship manager at GlobalFin, a premium financial institution.
 
 Customer Profile:
 - Name: {first_name}
@@ -54,28 +78,77 @@ Write a personalized, professional welcome message for this customer. The messag
 
 Do not use generic phrases. Make it feel personally crafted for {first_name}."""
 
+def build_template_prompt(segment, band):
+    """Shared prompt for every customer in a segment and age band"""
+    return f"""You are a professional banking relationship manager at GlobalFin, a premium financial institution.
+
+Customer Profile:
+- Name: {NAME_PLACEHOLDER}
+- Age: {band} years
+- Segment: {segment}
+
+Write a personalized, professional welcome message for this customer. The message should:
+1. Be warm but professional (corporate banking tone)
+2. Reference their specific segment and financial profile
+3. Suggest 2-3 relevant products/services based on their age and segment
+4. Be between 80-120 words
+5. End with a clear call-to-action
+
+Address the customer as {NAME_PLACEHOLDER}, written exactly like that, so the name can be filled in later."""
+
+def prepare_prompt(profile, template_mode=False):
+    """Return (prompt, cache_key) for a profile"""
+    if template_mode:
+        prompt = build_template_prompt(profile['segment'], age_band(profile['age']))
+    else:
+        prompt = build_prompt(profile['first_name'], profile['age'], profile['segment'],
+                              profile['ltv'], profile['risk_score'])
+    return prompt, cache_key(prompt, {'url': GEMINI_API_URL, **GENERATION_CONFIG})
+
+def post_prompt(session, prompt, timeout=10):
+    """POST a prompt to the Gemini API"""
+    return session.post(
+        f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
+        headers={'Content-Type': 'application/json'},
+        json={
+            'contents': [{
+                'parts': [{'text': prompt}]
+            }],
+            'generationConfig': GENERATION_CONFIG
+        },
+        timeout=timeout
+    )
+
+def parse_message(response):
+    """Extract the generated text from a Gemini response"""
+    data = response.json()
+    return data['candidates'][0]['content']['parts'][0]['text']
+
+def usable_message(message, template_mode):
+    """A template-mode message is shared by a whole segment and age band, so
+    it must address the customer through NAME_PLACEHOLDER, never by a name"""
+    return not template_mode or NAME_PLACEHOLDER in message
+
+def generate_ai_message(first_name, age, segment, ltv, risk_score, cache=None, template_mode=False):
+    """Generate personalized message using Gemini API (served from cache when possible)"""
+    profile = {'first_name': first_name, 'age': age, 'segment': segment, 'ltv': ltv, 'risk_score': risk_score}
+    prompt, key = prepare_prompt(profile, template_mode)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return fill_template(cached, first_name), True
+
     try:
-        response = requests.post(
-            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-            headers={'Content-Type': 'application/json'},
-            json={
-                'contents': [{
-                    'parts': [{'text': prompt}]
-                }],
-                'generationConfig': {
-                    'temperature': 0.7,
-                    'maxOutputTokens': 250,
-                    'topP': 0.8,
-                    'topK': 40
-                }
-            },
-            timeout=10
-        )
+        response = post_prompt(requests, prompt)
         
         if response.status_code == 200:
-            data = response.json()
-            message = data['candidates'][0]['content']['parts'][0]['text']
-            return message, True
+            message = parse_message(response)
+            if not usable_message(message, template_mode):
+                print("   ⚠ Template message without the name placeholder, using fallback")
+                return generate_fallback_message(first_name, segment), False
+            if cache:
+                cache.put(key, message)
+            return fill_template(message, first_name), True
         else:
             print(f"   ⚠ API Error: {response.status_code}")
             return generate_fallback_message(first_name, segment), False
@@ -84,6 +157,125 @@ Do not use generic phrases. Make it feel personally crafted for {first_name}."""
         print(f"   ⚠ API Request Failed: {str(e)}")
         return generate_fallback_message(first_name, segment), False
 
+def create_session(pool_size=DEFAULT_CONCURRENCY):
+    """HTTP session with a connection pool sized for the concurrency limit"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class TokenBucket:
+    """Async token-bucket rate limiter: ``rate`` tokens/sec, bursts up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def retry_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter, honouring a Retry-After header"""
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+async def generate_ai_messages_async(profiles, concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT,
+                                     max_retries=DEFAULT_MAX_RETRIES, session=None, stats=None,
+                                     cache=None, template_mode=False):
+    """Generate messages for many profiles concurrently.
+
+    At most ``concurrency`` requests are in flight, request starts are limited
+    to ``rate_limit`` per second and 429/5xx/connection errors are retried with
+    exponential backoff. Only a request that exhausts its retries falls back
+    to the template message. Cached prompts skip the API, and profiles sharing
+    a prompt share one request. Returns (message, api_success) in profile order.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate_limit)
+    stats = stats if stats is not None else Counter()
+    own_session = session is None
+    if own_session:
+        session = create_session(concurrency)
+    inflight = {}
+
+    async def fetch(prompt, executor):
+        """Call the API with retries; None once retries are exhausted"""
+        for attempt in range(max_retries + 1):
+            await bucket.acquire()
+            retry_after = None
+            async with semaphore:
+                try:
+                    response = await loop.run_in_executor(executor, partial(post_prompt, session, prompt))
+                except requests.RequestException:
+                    stats['connection_errors'] += 1
+                else:
+                    if response.status_code == 200:
+                        try:
+                            message = parse_message(response)
+                        except (KeyError, IndexError, ValueError):
+                            stats['malformed'] += 1
+                            break
+                        if not usable_message(message, template_mode):
+                            stats['no_placeholder'] += 1
+                            break
+                        stats['success'] += 1
+                        return message
+                    stats[f'http_{response.status_code}'] += 1
+                    if response.status_code not in RETRYABLE_STATUS:
+                        break
+                    retry_after = response.headers.get('Retry-After')
+            if attempt < max_retries:
+                stats['retries'] += 1
+                await asyncio.sleep(retry_delay(attempt, retry_after))
+        return None
+
+    async def generate(profile, executor):
+        prompt, key = prepare_prompt(profile, template_mode)
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return fill_template(cached, profile['first_name']), True
+        if key in inflight:
+            message = await inflight[key]
+        else:
+            inflight[key] = loop.create_future()
+            message = None
+            try:
+                message = await fetch(prompt, executor)
+            finally:
+                inflight[key].set_result(message)
+            if message is not None and cache:
+                cache.put(key, message)
+        if message is None:
+            stats['fallback'] += 1
+            return generate_fallback_message(profile['first_name'], profile['segment']), False
+        return fill_template(message, profile['first_name']), True
+
+    try:
+        # Blocking requests calls run on a pool no larger than the concurrency limit
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return await asyncio.gather(*(generate(profile, executor) for profile in profiles))
+    finally:
+        if own_session:
+            session.close()
+
 def generate_fallback_message(first_name, segment):
     """Fallback message if API fails"""
     messages = {
@@ -93,7 +285,163 @@ def generate_fallback_message(first_name, segment):
     }
     return messages.get(segment, f"Welcome to GlobalFin, {first_name}!")
 
-def orchestrate_customer_journey(age):
+def plan_journey(profile, age, rules):
+    """Choose channel and campaign for a profile"""
+    # Same channel rules as the CDP enrichment (segmentation_rules in cdp.db)
+    channel = lookup(rules, 'preferred_channel', age)
+    campaign = f"{profile['segment']} Welcome Journey"
+    return channel, campaign
+
+def iter_profile_batches(conn, segment=None, age_range=None, customer_ids=None,
+                         batch_size=DEFAULT_BATCH_SIZE):
+    """Stream matching customer_profiles as batches of profile dicts"""
+    conditions = []
+    params = []
+    if segment:
+        conditions.append("segment = ?")
+        params.append(segment)
+    if age_range:
+        conditions.append("age BETWEEN ? AND ?")
+        params.extend(age_range)
+    if customer_ids:
+        conditions.append("customer_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(customer_ids)))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    c = conn.cursor()
+    c.execute(f'''SELECT customer_id, first_name, last_name, email, segment, 
+                         lifetime_value, risk_score, age 
+                  FROM customer_profiles {where}
+                  ORDER BY customer_id''', params)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [{
+            'customer_id': row[0],
+            'first_name': row[1],
+            'last_name': row[2],
+            'email': row[3],
+            'segment': row[4],
+            'ltv': row[5],
+            'risk_score': row[6],
+            'age': row[7]
+        } for row in rows]
+
+@instrumentation.instrumented('orchestration')
+def orchestrate_batch(segment=None, age_range=None, customer_ids=None,
+                      batch_size=DEFAULT_BATCH_SIZE, use_ai=True, concurrency=DEFAULT_CONCURRENCY,
+                      rate_limit=DEFAULT_RATE_LIMIT, use_cache=True, template_mode=False):
+    """Orchestrate journeys for every matching customer profile"""
+    print("=" * 60)
+    print("GlobalFin Customer 360 - CJOP Batch Orchestration")
+    print("=" * 60)
+    print()
+    filters = []
+    if segment:
+        filters.append(f"segment '{segment}'")
+    if age_range:
+        filters.append(f"age {age_range[0]}-{age_range[1]}")
+    if customer_ids:
+        filters.append(f"{len(customer_ids)} customer ids")
+    print(f"Orchestrating journeys for {', '.join(filters) or 'all customers'} "
+          f"(batches of {batch_size}, {'Gemini AI' if use_ai else 'template messages'})...")
+    print()
+    
+    rules = compile_rules(load_rules('cdp.db'))
+    cdp_conn = instrumentation.connect('cdp.db')
+    cjop_conn = instrumentation.connect('cjop.db')
+    
+    session = create_session(concurrency) if use_ai else None
+    cache = MessageCache('cjop.db') if use_ai and use_cache else None
+    generation_stats = Counter()
+    
+    stage_time = defaultdict(float)
+    processed = 0
+    ai_count = 0
+    batches = iter_profile_batches(cdp_conn, segment, age_range, customer_ids, batch_size)
+    
+    while True:
+        started = time.perf_counter()
+        profiles = next(batches, None)
+        stage_time['Profile query'] += time.perf_counter() - started
+        if profiles is None:
+            break
+        instrumentation.record_batch(len(profiles))
+        
+        started = time.perf_counter()
+        plans = [plan_journey(profile, profile['age'], rules) for profile in profiles]
+        stage_time['Channel & campaign'] += time.perf_counter() - started
+        
+        started = time.perf_counter()
+        if use_ai:
+            messages = asyncio.run(generate_ai_messages_async(profiles, concurrency, rate_limit,
+                                                              session=session, stats=generation_stats,
+                                                              cache=cache, template_mode=template_mode))
+        else:
+            messages = [(generate_fallback_message(profile['first_name'], profile['segment']), False)
+                        for profile in profiles]
+        ai_count += sum(api_success for _, api_success in messages)
+        stage_time['Message generation'] += time.perf_counter() - started
+        
+        started = time.perf_counter()
+        with cjop_conn:
+            cjop_conn.executemany(INSERT_INTERACTION, [
+                (profile['customer_id'], profile['age'], profile['segment'], channel,
+                 campaign, message, 'Gemini Pro' if api_success else 'Fallback')
+                for profile, (channel, campaign), (message, api_success) in zip(profiles, plans, messages)
+            ])
+        stage_time['Interaction logging'] += time.perf_counter() - started
+        
+        processed += len(profiles)
+        print(f"   ✓ Orchestrated {processed} customers...")
+    
+    cdp_conn.close()
+    cjop_conn.close()
+    if session:
+        session.close()
+    if cache:
+        cache.close()
+    
+    total_time = sum(stage_time.values())
+    instrumentation.count('journeys', processed)
+    instrumentation.count('ai_messages', ai_count)
+    for key, count in generation_stats.items():
+        instrumentation.count(f'generation_{key}', count)
+    instrumentation.emit('stage_breakdown', stage='orchestration',
+                         seconds={stage: round(stage_time[stage], 4) for stage in BATCH_STAGES})
+    print()
+    print("=" * 60)
+    print(f"✅ Batch orchestration complete: {processed} journeys "
+          f"({ai_count} AI-generated, {processed - ai_count} fallback)")
+    print("=" * 60)
+    print()
+    print("Stage Throughput:")
+    for stage in BATCH_STAGES:
+        elapsed = stage_time[stage]
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        print(f"  • {stage}: {elapsed:.2f}s ({rate:,.0f} customers/sec)")
+    overall = processed / total_time if total_time > 0 else 0.0
+    print(f"  • Total: {total_time:.2f}s ({overall:,.0f} customers/sec)")
+    if generation_stats:
+        print()
+        print("AI Generation:")
+        for key, count in sorted(generation_stats.items()):
+            print(f"  • {key}: {count}")
+    if cache:
+        print_cache_stats(cache)
+    print()
+
+def print_cache_stats(cache):
+    """Report message cache counters"""
+    stats = cache.stats()
+    print()
+    print("Message Cache:")
+    print(f"  • Hits: {stats['hits']}  Misses: {stats['misses']}  (hit rate {stats['hit_rate']:.1%})")
+    print(f"  • Entries: {stats['entries']}  Expired: {stats['expired']}  Evicted: {stats['evicted']}")
+
+@instrumentation.instrumented('orchestration')
+def orchestrate_customer_journey(age, use_cache=True, template_mode=False):
     """Main CJOP orchestration logic"""
     print("=" * 60)
     print("GlobalFin Customer 360 - CJOP Orchestration")
@@ -117,23 +465,30 @@ def orchestrate_customer_journey(age):
     # Step 2: Determine channel and campaign
     print()
     print("[2/4] Determining optimal channel and campaign...")
-    channel = "Mobile App" if age < 40 else "Email"
-    campaign = f"{profile['segment']} Welcome Journey"
+    channel, campaign = plan_journey(profile, age, compile_rules(load_rules('cdp.db')))
     print(f"   ✓ Channel: {channel}")
     print(f"   ✓ Campaign: {campaign}")
     
     # Step 3: Generate personalized message with AI
     print()
     print("[3/4] Generating personalized message with Gemini AI...")
+    cache = MessageCache('cjop.db') if use_cache else None
     message, api_success = generate_ai_message(
         profile['first_name'],
         age,
         profile['segment'],
         profile['ltv'],
-        profile['risk_score']
+        profile['risk_score'],
+        cache=cache,
+        template_mode=template_mode
     )
+    if cache:
+        cache_hit = cache.hits > 0
+        cache.close()
     
-    if api_success:
+    if api_success and cache and cache_hit:
+        print("   ✓ AI-generated message served from cache")
+    elif api_success:
         print("   ✓ AI-generated message created")
     else:
         print("   ⚠ Using fallback message (API unavailable)")
@@ -141,12 +496,9 @@ def orchestrate_customer_journey(age):
     # Step 4: Log interaction to CJOP database
     print()
     print("[4/4] Logging interaction to CJOP database...")
-    conn = sqlite3.connect('cjop.db')
+    conn = instrumentation.connect('cjop.db')
     c = conn.cursor()
-    c.execute('''INSERT INTO interactions 
-                 (customer_id, customer_age, customer_segment, channel, 
-                  campaign_name, personalized_message, ai_model_used)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
+    c.execute(INSERT_INTERACTION,
               (profile['customer_id'], age, profile['segment'], channel,
                campaign, message, 'Gemini Pro' if api_success else 'Fallback'))
     conn.commit()
@@ -165,19 +517,56 @@ def orchestrate_customer_journey(age):
     print()
 
 if __name__ == "__main__":
+    import argparse
     import sys
     
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(
+        description="GlobalFin CJOP Orchestration",
+        epilog="Example: python cjop.py 35  |  python cjop.py --segment 'Young Professional' --no-ai")
+    parser.add_argument('age', nargs='?', help="orchestrate one customer of this age")
+    parser.add_argument('--segment', help="batch mode: all customers in this segment")
+    parser.add_argument('--age-range', help="batch mode: ages MIN-MAX (inclusive)")
+    parser.add_argument('--customer-ids', help="batch mode: comma-separated customer ids")
+    parser.add_argument('--all', action='store_true', help="batch mode: every customer profile")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--no-ai', action='store_true', help="use template messages instead of Gemini")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="batch mode: concurrent Gemini requests")
+    parser.add_argument('--rate-limit', type=float, default=DEFAULT_RATE_LIMIT,
+                        help="batch mode: Gemini requests per second")
+    parser.add_argument('--no-cache', action='store_true', help="always call Gemini, bypassing the message cache")
+    parser.add_argument('--template-mode', action='store_true',
+                        help="cache one message per segment and age band and fill in the name")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        instrumentation.configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.segment or args.age_range or args.customer_ids or args.all:
+        try:
+            age_range = tuple(int(part) for part in args.age_range.split('-')) if args.age_range else None
+            customer_ids = [int(part) for part in args.customer_ids.split(',')] if args.customer_ids else None
+        except ValueError:
+            parser.error("--age-range must be MIN-MAX and --customer-ids a comma-separated list of numbers")
+        if age_range and len(age_range) != 2:
+            parser.error("--age-range must be MIN-MAX")
+        orchestrate_batch(args.segment, age_range, customer_ids, args.batch_size, not args.no_ai,
+                          args.concurrency, args.rate_limit, not args.no_cache, args.template_mode)
+        sys.exit(0)
+    
+    if args.age is None:
         print("Usage: python cjop.py <customer_age>")
         print("Example: python cjop.py 35")
         sys.exit(1)
     
     try:
-        age = int(sys.argv[1])
+        age = int(args.age)
         if age < 18 or age > 100:
             print("Age must be between 18 and 100")
             sys.exit(1)
-        orchestrate_customer_journey(age)
+        orchestrate_customer_journey(age, not args.no_cache, args.template_mode)
     except ValueError:
         print("Invalid age. Please provide a number.")
         sys.exit(1)
@@ -0,0 +1,286 @@
+"""
+GlobalFin Customer 360 Platform - Duplicate Clustering
+Resolves match pairs into clusters and merges each into one golden record
+"""
+
+import json
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime
+
+import instrumentation
+from matching import MATCH_THRESHOLD, score_chunk
+from transformation import tune_connection
+
+DEFAULT_MAX_CLUSTER_SIZE = 50
+PAIR_FETCH_SIZE = 50000
+# Attributes filled from other cluster members when the survivor lacks them
+SURVIVOR_FILL_FIELDS = ('phone', 'age', 'address', 'city', 'country')
+SIZE_BUCKETS = ((2, '2'), (3, '3'), (5, '4-5'), (10, '6-10'), (None, '11+'))
+# A shared email merges on its own. A shared phone also needs similar names,
+# since households and businesses share numbers. Everything else (fuzzy
+# names, name + birth year, phone pairs with different names) goes to merge_review.
+AUTO_MERGE_TYPES = ('exact_email',)
+NAME_CONFIRMED_TYPES = ('exact_phone',)
+
+class UnionFind:
+    """Disjoint sets over golden_ids: union by size, path halving"""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent
+        root = parent.setdefault(item, item)
+        if root == item:
+            self.size.setdefault(item, 1)
+            return item
+        while parent[root] != root:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        parent[item] = root
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+    def clusters(self):
+        """root -> member list, for sets with at least two members"""
+        members = {}
+        for item in self.parent:
+            root = self.find(item)
+            if self.size[root] > 1:
+                members.setdefault(root, []).append(item)
+        return members
+
+def load_merged(cursor):
+    """golden_id -> survivor for records merged by earlier runs"""
+    cursor.execute("SELECT golden_id, merged_into FROM golden_records WHERE merged_into IS NOT NULL")
+    return dict(cursor.fetchall())
+
+def iter_match_pairs(cursor, min_score=MATCH_THRESHOLD, merged=None):
+    """Stream (golden_id, golden_id, match_type, match_score) pairs from match_history.
+
+    Ids merged by an earlier run are replaced by their survivor, so new
+    matches against them join the existing cluster.
+    """
+    merged = merged or {}
+    cursor.execute('''SELECT matched_records, match_type, match_score FROM match_history
+                      WHERE match_score IS NULL OR match_score >= ?''', (min_score,))
+    while True:
+        rows = cursor.fetchmany(PAIR_FETCH_SIZE)
+        if not rows:
+            return
+        for matched_records, match_type, match_score in rows:
+            ids = [int(part) for part in matched_records.split(',') if part]
+            ids = [merged.get(golden_id, golden_id) for golden_id in ids]
+            # Exact-key groups list every member; pair each with the first
+            for other in ids[1:]:
+                if other != ids[0]:
+                    yield ids[0], other, match_type, match_score
+
+def name_confirmed(conn, pairs):
+    """The (golden_id, golden_id) pairs whose names match like a fuzzy name match"""
+    ids = sorted({golden_id for pair in pairs for golden_id in pair})
+    names = {}
+    for start in range(0, len(ids), 1000):
+        names.update((row[0], row) for row in conn.execute(
+            '''SELECT golden_id, first_name, last_name FROM golden_records
+               WHERE is_active = 1 AND golden_id IN (SELECT value FROM json_each(?))''',
+            (json.dumps(ids[start:start + 1000]),)))
+    records = list(names.values())
+    position = {row[0]: index for index, row in enumerate(records)}
+    scored = [(position[a], position[b]) for a, b in pairs if a in position and b in position]
+    return {(records[i][0], records[j][0]) for i, j, _ in score_chunk(records, scored)}
+
+def survivor_rank(record):
+    """Sort key: best record first (quality, confidence, most recent, oldest id)"""
+    return (-(record['data_quality_score'] or 0), -(record['confidence_score'] or 0),
+            -_timestamp(record['updated_at']), record['golden_id'])
+
+def _timestamp(text):
+    """Seconds for an updated_at value, with or without fractional seconds"""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+def merge_cluster(records):
+    """Apply survivorship rules; returns (survivor golden_id, filled fields, merged ids)"""
+    ranked = sorted(records, key=survivor_rank)
+    survivor = ranked[0]
+    filled = {}
+    for field in SURVIVOR_FILL_FIELDS:
+        if survivor[field] in (None, ''):
+            donor = next((record[field] for record in ranked[1:] if record[field] not in (None, '')), None)
+            if donor is not None:
+                filled[field] = donor
+    return survivor['golden_id'], filled, [record['golden_id'] for record in ranked[1:]]
+
+def fetch_members(conn, golden_ids):
+    """golden_records rows for the given ids, as dicts"""
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(f'''SELECT golden_id, data_quality_score, confidence_score, updated_at,
+                                   {', '.join(SURVIVOR_FILL_FIELDS)}
+                            FROM golden_records
+                            WHERE is_active = 1 AND golden_id IN (SELECT value FROM json_each(?))''',
+                        (json.dumps(golden_ids),)).fetchall()
+    conn.row_factory = None
+    return rows
+
+def size_histogram(sizes):
+    histogram = Counter()
+    for size in sizes:
+        for limit, label in SIZE_BUCKETS:
+            if limit is None or size <= limit:
+                histogram[label] += 1
+                break
+    return {label: histogram[label] for _, label in SIZE_BUCKETS}
+
+@instrumentation.instrumented('clustering')
+def cluster_duplicates(min_score=MATCH_THRESHOLD, max_cluster_size=DEFAULT_MAX_CLUSTER_SIZE, dry_run=False):
+    print("=" * 60)
+    print("GlobalFin Customer 360 - Duplicate Clustering")
+    print("=" * 60)
+    print()
+
+    conn = instrumentation.connect('mdm.db')
+    tune_connection(conn)
+    start_time = time.perf_counter()
+
+    print(f"[1/3] Building clusters from match_history (score >= {min_score})...")
+    forest = UnionFind()
+    review = {}
+    pair_count = 0
+    cursor = conn.cursor()
+    unconfirmed = {}
+    for a, b, match_type, match_score in iter_match_pairs(cursor, min_score, load_merged(cursor)):
+        pair_count += 1
+        if match_type in AUTO_MERGE_TYPES:
+            forest.union(a, b)
+        elif match_type in NAME_CONFIRMED_TYPES:
+            unconfirmed.setdefault((a, b), (match_type, match_score))
+        else:
+            review.setdefault((min(a, b), max(a, b)), (match_type, match_score))
+    confirmed = name_confirmed(conn, list(unconfirmed))
+    for (a, b), match in unconfirmed.items():
+        if (a, b) in confirmed:
+            forest.union(a, b)
+        else:
+            review.setdefault((min(a, b), max(a, b)), match)
+    clusters = forest.clusters()
+    cluster_time = time.perf_counter() - start_time
+    rate = pair_count / cluster_time if cluster_time > 0 else 0.0
+    print(f"   ✓ {pair_count} pairs → {len(clusters)} clusters ({cluster_time:.2f}s, {rate:,.0f} pairs/sec)")
+
+    # Very large clusters are usually chains of loose name matches, not one person
+    oversized = {root: members for root, members in clusters.items() if len(members) > max_cluster_size}
+    for root in oversized:
+        del clusters[root]
+    if oversized:
+        print(f"   ⚠ Skipped {len(oversized)} clusters larger than {max_cluster_size} records for review")
+
+    print("[2/3] Applying survivorship rules...")
+    survivor_updates = []
+    merged = []
+    cluster_items = list(clusters.values())
+    for start in range(0, len(cluster_items), 1000):
+        chunk = cluster_items[start:start + 1000]
+        rows = {row['golden_id']: row for row in
+                fetch_members(conn, [golden_id for members in chunk for golden_id in members])}
+        for members in chunk:
+            records = [rows[golden_id] for golden_id in members if golden_id in rows]
+            if len(records) < 2:
+                continue
+            survivor_id, filled, merged_ids = merge_cluster(records)
+            if filled:
+                survivor_updates.append((survivor_id, filled))
+            merged.extend((survivor_id, golden_id) for golden_id in merged_ids)
+    instrumentation.count('pairs', pair_count)
+    instrumentation.count('clusters', len(clusters))
+    instrumentation.count('merged', len(merged))
+
+    # Pairs not already joined through a confirmed contact match wait for review
+    survivors = {golden_id: survivor_id for survivor_id, golden_id in merged}
+    review_rows = {}
+    for (a, b), (match_type, match_score) in review.items():
+        a, b = survivors.get(a, a), survivors.get(b, b)
+        if a != b:
+            review_rows.setdefault((min(a, b), max(a, b)), (match_type, match_score))
+    instrumentation.count('review', len(review_rows))
+
+    if dry_run:
+        print(f"[3/3] Dry run: no golden records changed ({len(review_rows)} pairs need review)")
+    else:
+        print("[3/3] Merging clusters into surviving golden records...")
+        with conn:
+            for survivor_id, filled in survivor_updates:
+                assignments = ', '.join(f"{field} = ?" for field in filled)
+                conn.execute(f'''UPDATE golden_records SET {assignments},
+                                 updated_at = CURRENT_TIMESTAMP WHERE golden_id = ?''',
+                             (*filled.values(), survivor_id))
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS merge_map (golden_id INTEGER PRIMARY KEY, survivor_id INTEGER)")
+            conn.execute("DELETE FROM temp.merge_map")
+            conn.executemany("INSERT OR REPLACE INTO temp.merge_map (survivor_id, golden_id) VALUES (?, ?)", merged)
+            # One statement deactivates every merged record
+            conn.execute('''UPDATE golden_records
+                            SET is_active = 0,
+                                merged_into = (SELECT survivor_id FROM temp.merge_map m
+                                               WHERE m.golden_id = golden_records.golden_id),
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE golden_id IN (SELECT golden_id FROM temp.merge_map)''')
+            # Merged records leave the blocking index, so matching never pairs them again
+            conn.execute("DELETE FROM blocking_index WHERE golden_id IN (SELECT golden_id FROM temp.merge_map)")
+            conn.execute("DELETE FROM exact_key_index WHERE golden_id IN (SELECT golden_id FROM temp.merge_map)")
+            # Records merged earlier into a record merged now follow it
+            conn.execute('''UPDATE golden_records
+                            SET merged_into = (SELECT survivor_id FROM temp.merge_map m
+                                               WHERE m.golden_id = golden_records.merged_into)
+                            WHERE merged_into IN (SELECT golden_id FROM temp.merge_map)''')
+            queued = conn.executemany('''INSERT OR IGNORE INTO merge_review (golden_id_1, golden_id_2, match_type, match_score)
+                                         VALUES (?, ?, ?, ?)''',
+                                      [(*pair, *match) for pair, match in review_rows.items()]).rowcount
+        print(f"   • {len(review_rows)} pairs without a confirmed contact match need review "
+              f"({queued} newly queued in merge_review)")
+    conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    sizes = [len(members) for members in clusters.values()]
+    print()
+    print("=" * 60)
+    print(f"✅ Clustering complete: {len(clusters)} clusters, {len(merged)} records merged ({elapsed:.2f}s)")
+    print("=" * 60)
+    print()
+    if sizes:
+        print("Cluster Sizes:")
+        for label, count in size_histogram(sizes).items():
+            print(f"  • {label} records: {count} clusters")
+        print(f"  • Largest: {max(sizes)}  Mean: {sum(sizes) / len(sizes):.2f}")
+        print()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GlobalFin MDM duplicate clustering")
+    parser.add_argument('--min-score', type=float, default=MATCH_THRESHOLD,
+                        help="ignore match_history pairs scoring below this")
+    parser.add_argument('--max-cluster-size', type=int, default=DEFAULT_MAX_CLUSTER_SIZE,
+                        help="leave larger clusters unmerged for review")
+    parser.add_argument('--dry-run', action='store_true', help="report clusters without merging")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        instrumentation.configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    cluster_duplicates(args.min_score, args.max_cluster_size, args.dry_run)
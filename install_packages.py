@@ -9,5 +9,6 @@ python setup_databases.py
 python activate.py 100
 python transformation.py
 python matching.py
+python clustering.py
 python safecdpdata.py
 python cjop.py 35
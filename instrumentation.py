@@ -0,0 +1,281 @@
+"""
+GlobalFin Customer 360 Platform - Instrumentation
+Stage timers, counters and SQLite statement timings as JSON lines
+"""
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import re
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+# GLOBALFIN_METRICS: JSON-lines destination (a file path, or '-' for stderr).
+# GLOBALFIN_PROFILE: comma-separated captures per stage: cprofile, tracemalloc.
+# GLOBALFIN_PROFILE_DIR: where cProfile .prof files are written.
+METRICS_ENV = 'GLOBALFIN_METRICS'
+PROFILE_ENV = 'GLOBALFIN_PROFILE'
+PROFILE_DIR_ENV = 'GLOBALFIN_PROFILE_DIR'
+PROFILERS = ('cprofile', 'tracemalloc')
+TOP_STATEMENTS = 20
+TOP_FUNCTIONS = 15
+
+_config = {
+    'metrics': os.environ.get(METRICS_ENV) or None,
+    'profile': {name for name in os.environ.get(PROFILE_ENV, '').split(',') if name},
+    'profile_dir': os.environ.get(PROFILE_DIR_ENV, '.'),
+}
+_write_lock = threading.Lock()
+_local = threading.local()
+_last_stage = None
+
+def configure(metrics=None, profile=None, profile_dir=None):
+    """Override the environment settings (e.g. from command-line flags)"""
+    if metrics is not None:
+        _config['metrics'] = metrics
+    if profile is not None:
+        _config['profile'] = set(profile)
+    if profile_dir is not None:
+        _config['profile_dir'] = profile_dir
+
+def enabled():
+    return _config['metrics'] is not None
+
+def add_arguments(parser):
+    """--metrics/--profile flags shared by the stage scripts"""
+    parser.add_argument('--metrics', metavar='PATH',
+                        help=f"write JSON-lines metrics here ('-' for stderr; env {METRICS_ENV})")
+    parser.add_argument('--profile', metavar='NAMES',
+                        help=f"per-stage capture: {', '.join(PROFILERS)} (comma-separated; env {PROFILE_ENV})")
+
+def configure_from_args(args):
+    profile = [name for name in args.profile.split(',') if name] if args.profile else None
+    unknown = [name for name in profile or [] if name not in PROFILERS]
+    if unknown:
+        raise ValueError(f"Unknown profiler(s): {', '.join(unknown)} (available: {', '.join(PROFILERS)})")
+    configure(args.metrics, profile)
+    if profile and args.metrics is None and not enabled():
+        configure(metrics='-')
+
+def emit(event, **fields):
+    """Write one JSON line (no-op unless metrics are enabled)"""
+    destination = _config['metrics']
+    if destination is None:
+        return
+    record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'event': event, 'pid': os.getpid()}
+    record.update(fields)
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        if destination == '-':
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(destination, 'a') as f:
+                f.write(line + '\n')
+
+class Stage:
+    """Counters, batch sizes and statement timings of one running stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = defaultdict(int)
+        self.batches = {'count': 0, 'rows': 0, 'min': None, 'max': None}
+        self.statements = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def batch(self, size):
+        with self.lock:
+            batches = self.batches
+            batches['count'] += 1
+            batches['rows'] += size
+            batches['min'] = size if batches['min'] is None else min(batches['min'], size)
+            batches['max'] = size if batches['max'] is None else max(batches['max'], size)
+
+    def statement(self, sql, seconds, call=True):
+        """Charge time to a statement; fetches add time but not calls"""
+        with self.lock:
+            timing = self.statements[sql]
+            timing['calls'] += call
+            timing['seconds'] += seconds
+            if seconds > timing['max_seconds']:
+                timing['max_seconds'] = seconds
+
+def current_stage():
+    """Innermost stage of this thread, else the stage most recently started"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else _last_stage
+
+def count(name, n=1):
+    stage = current_stage()
+    if stage is not None:
+        stage.count(name, n)
+
+def record_batch(size):
+    stage = current_stage()
+    if stage is not None:
+        stage.batch(size)
+
+class _Profilers:
+    """cProfile/tracemalloc capture around a stage, as configured"""
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = cProfile.Profile() if 'cprofile' in _config['profile'] else None
+        self.tracing = 'tracemalloc' in _config['profile']
+        self.started_tracemalloc = False
+
+    def start(self):
+        if self.tracing:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self.started_tracemalloc = True
+        if self.profiler:
+            self.profiler.enable()
+
+    def stop(self):
+        """Returns the fields to add to the stage_end event"""
+        fields = {}
+        if self.profiler:
+            self.profiler.disable()
+            path = os.path.join(_config['profile_dir'], f"{self.name}-{os.getpid()}.prof")
+            self.profiler.dump_stats(path)
+            stats = pstats.Stats(self.profiler)
+            fields['cprofile'] = {'path': path, 'top': [
+                {'function': f"{func[0]}:{func[1]}({func[2]})", 'calls': entry[1],
+                 'tottime': round(entry[2], 4), 'cumtime': round(entry[3], 4)}
+                for func, entry in sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]]}
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            fields['tracemalloc'] = {'current_bytes': current, 'peak_bytes': peak, 'top': [
+                {'line': str(stat.traceback), 'bytes': stat.size, 'count': stat.count} for stat in top]}
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+        return fields
+
+class stage:
+    """Context manager (and decorator via ``instrumented``) timing one stage"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        global _last_stage
+        self.stage = Stage(self.name)
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        _local.stack.append(self.stage)
+        _last_stage = self.stage
+        self.profilers = _Profilers(self.name) if enabled() and _config['profile'] else None
+        emit('stage_start', stage=self.name, **self.fields)
+        if self.profilers:
+            self.profilers.start()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        return self.stage
+
+    def __exit__(self, exc_type, exc, tb):
+        global _last_stage
+        elapsed = time.perf_counter() - self.started
+        cpu = time.process_time() - self.cpu_started
+        extra = self.profilers.stop() if self.profilers else {}
+        _local.stack.pop()
+        if _last_stage is self.stage:
+            _last_stage = _local.stack[-1] if _local.stack else None
+        if not enabled():
+            return False
+        batches = dict(self.stage.batches)
+        if batches['count']:
+            batches['mean'] = round(batches['rows'] / batches['count'], 1)
+        emit('stage_end', stage=self.name, status='failed' if exc_type else 'completed',
+             wall_seconds=round(elapsed, 4), cpu_seconds=round(cpu, 4),
+             counters=dict(self.stage.counters), batches=batches, **extra)
+        statements = sorted(self.stage.statements.items(), key=lambda item: -item[1]['seconds'])
+        for sql, timing in statements[:TOP_STATEMENTS]:
+            emit('sql', stage=self.name, sql=sql, calls=timing['calls'],
+                 seconds=round(timing['seconds'], 4), max_seconds=round(timing['max_seconds'], 4))
+        return False
+
+def instrumented(name):
+    """Decorator: run the function as a named stage"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+_WHITESPACE = re.compile(r'\s+')
+
+def _normalize(sql):
+    return _WHITESPACE.sub(' ', sql).strip()[:300]
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to its statement"""
+
+    def _timed(self, method, sql, *args):
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self._sql = _normalize(sql)
+            self._charge(time.perf_counter() - started, True)
+
+    def _charge(self, seconds, call=False):
+        stage = current_stage()
+        if stage is not None and getattr(self, '_sql', None):
+            stage.statement(self._sql, seconds, call)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._charge(time.perf_counter() - started)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements go through TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def connect(database, **kwargs):
+    """sqlite3.connect, with statement timings when metrics are enabled"""
+    if enabled():
+        kwargs.setdefault('factory', TimedConnection)
+    return sqlite3.connect(database, **kwargs)
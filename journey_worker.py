@@ -0,0 +1,228 @@
+"""
+GlobalFin Customer 360 Platform - Journey Worker
+Resident worker that advances journey_states rows in cjop.db
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+from collections import Counter
+
+from cjop import (DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT, INSERT_INTERACTION, create_session,
+                  generate_ai_messages_async, generate_fallback_message, get_profile_lookup,
+                  iter_profile_batches, plan_journey)
+from message_cache import MessageCache
+from segmentation import compile_rules, load_rules
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+DEFAULT_LEASE = 300.0  # seconds before another worker may reclaim a row
+DEFAULT_JOURNEY = 'Welcome Journey'
+
+# Step machine: enrolled -> planned -> contacted. A claimed row is advanced
+# through every step it can reach before it is released.
+ENROLLED = 'enrolled'
+PLANNED = 'planned'
+CONTACTED = 'contacted'
+FAILED = 'failed'
+ACTIVE_STEPS = (ENROLLED, PLANNED)
+
+# One UPDATE claims a batch atomically, so concurrent workers never get the
+# same row. Rows whose lease has run out (crashed worker) are claimable again.
+CLAIM_BATCH = f'''UPDATE journey_states SET claimed_by = ?, claimed_at = ?
+                  WHERE id IN (SELECT id FROM journey_states
+                               WHERE current_step IN ({', '.join('?' * len(ACTIVE_STEPS))})
+                                 AND (claimed_by IS NULL OR claimed_at < ?)
+                               ORDER BY id LIMIT ?)
+                  RETURNING id, customer_id, journey_name, current_step'''
+
+# Only the worker still holding the claim may write the row back
+RELEASE_ROW = '''UPDATE journey_states
+                 SET current_step = ?, next_action = ?, claimed_by = NULL, claimed_at = NULL,
+                     updated_at = CURRENT_TIMESTAMP
+                 WHERE id = ? AND claimed_by = ?'''
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def connect_queue(db_path='cjop.db'):
+    """cjop.db connection tuned for several workers writing side by side"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+def enqueue_journeys(conn, segment=None, age_range=None, customer_ids=None, journey_name=DEFAULT_JOURNEY):
+    """Enroll matching CDP profiles in a journey; returns the number of rows added"""
+    cdp_conn = sqlite3.connect('cdp.db')
+    added = 0
+    for profiles in iter_profile_batches(cdp_conn, segment, age_range, customer_ids):
+        with conn:
+            conn.executemany('''INSERT INTO journey_states (customer_id, journey_name, current_step, next_action)
+                                VALUES (?, ?, ?, 'Plan channel and campaign')''',
+                             [(profile['customer_id'], journey_name, ENROLLED) for profile in profiles])
+        added += len(profiles)
+    cdp_conn.close()
+    return added
+
+def claim_batch(conn, worker_id, batch_size=DEFAULT_BATCH_SIZE, lease=DEFAULT_LEASE):
+    """Claim up to ``batch_size`` active rows for this worker"""
+    now = time.time()
+    with conn:
+        return conn.execute(CLAIM_BATCH, (worker_id, now, *ACTIVE_STEPS, now - lease, batch_size)).fetchall()
+
+class JourneyWorker:
+    """Claims journey_states rows in batches and advances them.
+
+    The cjop.db connection, compiled rules, profile cache, message cache and
+    HTTP session stay open for the worker's lifetime.
+    """
+
+    def __init__(self, worker_id=None, batch_size=DEFAULT_BATCH_SIZE, lease=DEFAULT_LEASE,
+                 use_ai=True, concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT,
+                 use_cache=True, template_mode=False):
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size
+        self.lease = lease
+        self.use_ai = use_ai
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.template_mode = template_mode
+        self.conn = connect_queue()
+        self.rules = compile_rules(load_rules('cdp.db'))
+        self.profiles = get_profile_lookup()
+        self.session = create_session(concurrency) if use_ai else None
+        self.cache = MessageCache('cjop.db') if use_ai and use_cache else None
+        self.stats = Counter()
+        self.generation_stats = Counter()
+
+    def generate_messages(self, profiles):
+        if not profiles:
+            return []
+        if self.use_ai:
+            return asyncio.run(generate_ai_messages_async(
+                profiles, self.concurrency, self.rate_limit, session=self.session,
+                stats=self.generation_stats, cache=self.cache, template_mode=self.template_mode))
+        return [(generate_fallback_message(profile['first_name'], profile['segment']), False)
+                for profile in profiles]
+
+    def process_batch(self, rows):
+        """Advance claimed rows as far as they go; returns rows written back"""
+        updates = []
+        interactions = {}
+        to_contact = []
+        for state_id, customer_id, journey_name, step in rows:
+            profile = self.profiles.by_customer_id(customer_id)
+            if profile is None:
+                updates.append((FAILED, 'Profile not found in CDP', state_id))
+                continue
+            channel, campaign = plan_journey(profile, profile['age'], self.rules)
+            if journey_name and journey_name != DEFAULT_JOURNEY:
+                campaign = f"{profile['segment']} {journey_name}"
+            # enrolled rows are planned here and contacted in the same pass
+            to_contact.append((state_id, profile, channel, campaign))
+
+        messages = self.generate_messages([profile for _, profile, _, _ in to_contact])
+        for (state_id, profile, channel, campaign), (message, api_success) in zip(to_contact, messages):
+            updates.append((CONTACTED, f"Await response via {channel}", state_id))
+            interactions[state_id] = (profile['customer_id'], profile['age'], profile['segment'], channel,
+                                      campaign, message, 'Gemini Pro' if api_success else 'Fallback')
+            self.stats['ai' if api_success else 'fallback'] += 1
+
+        written = 0
+        with self.conn:
+            for step, next_action, state_id in updates:
+                if not self.conn.execute(RELEASE_ROW, (step, next_action, state_id, self.worker_id)).rowcount:
+                    # Lease expired and another worker took the row over
+                    self.stats['lost_claims'] += 1
+                    continue
+                written += 1
+                self.stats[step] += 1
+                if state_id in interactions:
+                    self.conn.execute(INSERT_INTERACTION, interactions[state_id])
+        return written
+
+    def run_once(self):
+        """Claim and process one batch; returns the number of rows claimed"""
+        rows = claim_batch(self.conn, self.worker_id, self.batch_size, self.lease)
+        if rows:
+            self.stats['claimed'] += len(rows)
+            self.process_batch(rows)
+        return len(rows)
+
+    def run(self, poll_interval=DEFAULT_POLL_INTERVAL, exit_when_idle=False):
+        """Poll until interrupted (or until the queue is empty with exit_when_idle)"""
+        try:
+            while True:
+                if self.run_once():
+                    print(f"   ✓ [{self.worker_id}] {self.stats[CONTACTED]} journeys contacted...")
+                    continue
+                if exit_when_idle:
+                    return
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print(f"\n   ⚠ [{self.worker_id}] interrupted; unfinished claims expire after {self.lease:.0f}s")
+
+    def close(self):
+        self.conn.close()
+        if self.session:
+            self.session.close()
+        if self.cache:
+            self.cache.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GlobalFin CJOP journey worker")
+    parser.add_argument('--enqueue', action='store_true', help="enroll profiles before working")
+    parser.add_argument('--segment', help="with --enqueue: only this segment")
+    parser.add_argument('--age-range', help="with --enqueue: ages MIN-MAX (inclusive)")
+    parser.add_argument('--journey', default=DEFAULT_JOURNEY, help="with --enqueue: journey name")
+    parser.add_argument('--worker-id', help="defaults to host:pid")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                        help="seconds before an unfinished claim can be taken over")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument('--exit-when-idle', action='store_true', help="stop once the queue is empty")
+    parser.add_argument('--no-ai', action='store_true', help="use template messages instead of Gemini")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate-limit', type=float, default=DEFAULT_RATE_LIMIT)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--template-mode', action='store_true')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("GlobalFin Customer 360 - CJOP Journey Worker")
+    print("=" * 60)
+    print()
+
+    if args.enqueue:
+        try:
+            age_range = tuple(int(part) for part in args.age_range.split('-')) if args.age_range else None
+        except ValueError:
+            parser.error("--age-range must be MIN-MAX")
+        conn = connect_queue()
+        added = enqueue_journeys(conn, args.segment, age_range, journey_name=args.journey)
+        conn.close()
+        print(f"   ✓ Enrolled {added} customers in '{args.journey}'")
+        print()
+
+    worker = JourneyWorker(args.worker_id, args.batch_size, args.lease, not args.no_ai,
+                           args.concurrency, args.rate_limit, not args.no_cache, args.template_mode)
+    print(f"Worker {worker.worker_id} polling journey_states (batches of {worker.batch_size})...")
+    print()
+    worker.run(args.poll_interval, args.exit_when_idle)
+    worker.close()
+
+    print()
+    print("=" * 60)
+    print(f"✅ Worker stopped: {worker.stats['claimed']} rows claimed")
+    print("=" * 60)
+    for key, count in sorted(worker.stats.items()):
+        print(f"  • {key}: {count}")
+    cache_stats = worker.profiles.stats()
+    print(f"  • profile cache hit rate: {cache_stats['hit_rate']:.1%}")
+    print()
@@ -0,0 +1,366 @@
+"""
+GlobalFin Customer 360 Platform - Real-time Matching Service
+Resident blocking and exact-key indexes for single-record match and upsert
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+from matching import (BLOCKING_KEYS, DEFAULT_FIELD_SCORERS, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_WINDOW,
+                      EXACT_KEYS, blocking_entries, exact_key_entries, score_chunk, sort_value)
+from transformation import QUALITY, clean_email, standardize_name, tune_connection
+
+DEFAULT_PORT = 8360
+DEFAULT_SOURCE_SYSTEM = 'Onboarding_API'
+LOAD_FETCH_SIZE = 10000
+DEFAULT_REFRESH_INTERVAL = 1.0  # seconds
+RECORD_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'age', 'address', 'city', 'country')
+
+# Row layout used for indexing: the matching record (golden_id, first_name,
+# last_name, email, updated_at) followed by the extra exact-key columns
+LOAD_COLUMNS = 'golden_id, first_name, last_name, email, updated_at, phone, age, country, created_at'
+LOAD_QUERY = f"SELECT {LOAD_COLUMNS} FROM golden_records WHERE is_active = 1"
+
+def exact_key_row(row):
+    """Loaded row -> the (golden_id, email, phone, first_name, last_name, age,
+    country, created_at) layout of matching.EXACT_KEYS"""
+    golden_id, first_name, last_name, email, _, phone, age, country, created_at = row
+    return (golden_id, email, phone, first_name, last_name, age, country, created_at)
+
+class MatchService:
+    """In-memory indexes over the active golden records of one mdm.db.
+
+    Blocking keys, the sorted-neighbourhood order and the exact keys are built
+    in a single pass over golden_records when the service starts. Afterwards
+    every upsert writes through to mdm.db (golden record, blocking_index and
+    exact_key_index rows, match_history candidates) and updates the indexes
+    in place, so the database is never rescanned. Changes by other writers,
+    such as clustering merges, are picked up through updated_at at most every
+    ``refresh_interval`` seconds. All methods are thread-safe.
+    """
+
+    def __init__(self, db_path='mdm.db', window=DEFAULT_WINDOW, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                 field_scorers=None, source_system=DEFAULT_SOURCE_SYSTEM,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.max_block_size = max_block_size
+        self.field_scorers = {**DEFAULT_FIELD_SCORERS, **(field_scorers or {})}
+        self.source_system = source_system
+        self.lock = threading.Lock()
+        self.conn = instrumentation.connect(db_path, check_same_thread=False)
+        tune_connection(self.conn)
+        self.records = {}
+        self.keys_of = {}
+        self.blocks = {key_name: {} for key_name in BLOCKING_KEYS}
+        self.exact = {key_name: {} for key_name in EXACT_KEYS}
+        self.order = []
+        self.stats = {'matches': 0, 'upserts': 0, 'created': 0, 'updated': 0, 'refreshed': 0, 'seconds': 0.0}
+        self.load()
+
+    def load(self):
+        started = time.perf_counter()
+        # Read before the scan, so rows changed during it are refreshed later
+        self.watermark = self.conn.execute("SELECT MAX(updated_at) FROM golden_records").fetchone()[0]
+        self.refreshed_at = time.monotonic()
+        order = []
+        cursor = self.conn.execute(LOAD_QUERY)
+        while True:
+            rows = cursor.fetchmany(LOAD_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                self._index(row, order=order)
+        order.sort()
+        self.order = order
+        self.load_seconds = time.perf_counter() - started
+
+    def _refresh(self):
+        """Re-index golden records changed since the watermark (call with the lock held).
+
+        Rows of the watermark's own second are read again, since updated_at
+        has one-second resolution; re-indexing a row is idempotent.
+        """
+        now = time.monotonic()
+        if now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = now
+        rows = self.conn.execute(f"SELECT {LOAD_COLUMNS}, is_active FROM golden_records WHERE updated_at >= ?",
+                                 (self.watermark or '',)).fetchall()
+        for row in rows:
+            self._unindex(row[0])
+            if row[-1]:
+                self._index(row[:-1])
+            if self.watermark is None or row[4] > self.watermark:
+                self.watermark = row[4]
+        self.stats['refreshed'] += len(rows)
+
+    def _keys(self, row):
+        """(index, key) entries of a loaded-layout row"""
+        record = row[:5]
+        keys = [(self.blocks[key_name], key_func(record)) for key_name, key_func in BLOCKING_KEYS.items()]
+        exact_row = exact_key_row(row)
+        keys.extend((self.exact[key_name], key_func(exact_row)) for key_name, (_, key_func) in EXACT_KEYS.items())
+        return [(index, key) for index, key in keys if key is not None]
+
+    def _index(self, row, order=None):
+        golden_id = row[0]
+        self.records[golden_id] = row[:5]
+        keys = self._keys(row)
+        for index, key in keys:
+            index.setdefault(key, []).append(golden_id)
+        self.keys_of[golden_id] = keys
+        entry = (sort_value(row), golden_id)
+        if order is not None:
+            order.append(entry)
+        else:
+            insort(self.order, entry)
+
+    def _unindex(self, golden_id):
+        for index, key in self.keys_of.pop(golden_id, ()):
+            members = index.get(key)
+            if members is not None:
+                members.remove(golden_id)
+                if not members:
+                    del index[key]
+        record = self.records.pop(golden_id, None)
+        if record is not None:
+            position = bisect_left(self.order, (sort_value(record), golden_id))
+            if position < len(self.order) and self.order[position][1] == golden_id:
+                del self.order[position]
+
+    def _candidates(self, row):
+        """Exact-key hits and fuzzy name matches for a loaded-layout row"""
+        golden_id = row[0]
+        found = {}
+        exact_row = exact_key_row(row)
+        for key_name, (match_type, key_func) in EXACT_KEYS.items():
+            key = key_func(exact_row)
+            for other in self.exact[key_name].get(key, ()) if key is not None else ():
+                if other != golden_id:
+                    found.setdefault(other, []).append((match_type, 1.0))
+
+        neighbours = set()
+        record = row[:5]
+        for key_name, key_func in BLOCKING_KEYS.items():
+            members = self.blocks[key_name].get(key_func(record), ())
+            if len(members) <= self.max_block_size:
+                neighbours.update(members)
+        if self.window and self.window > 1:
+            position = bisect_left(self.order, (sort_value(record), golden_id or 0))
+            neighbours.update(other for _, other in self.order[max(0, position - self.window + 1):
+                                                               position + self.window])
+        neighbours.discard(golden_id)
+
+        others = [self.records[other] for other in sorted(neighbours)]
+        pairs = [(0, position) for position in range(1, len(others) + 1)]
+        for _, position, score in score_chunk([record] + others, pairs, self.field_scorers):
+            found.setdefault(others[position - 1][0], []).append(('fuzzy_name', score))
+
+        candidates = []
+        for other, hits in found.items():
+            _, first_name, last_name, email, _ = self.records[other]
+            candidates.append({'golden_id': other, 'name': f"{first_name} {last_name}", 'email': email,
+                               'match_types': [match_type for match_type, _ in hits],
+                               'score': round(max(score for _, score in hits), 4)})
+        candidates.sort(key=lambda candidate: (-candidate['score'], candidate['golden_id']))
+        return candidates
+
+    def _prepare(self, customer):
+        """Standardized golden row for an incoming record dict"""
+        if not isinstance(customer, dict):
+            raise TypeError("customer record must be a JSON object")
+        missing = [field for field in ('first_name', 'last_name', 'email') if not customer.get(field)]
+        if missing:
+            raise ValueError(f"Missing field(s): {', '.join(missing)}")
+        not_text = [field for field in RECORD_FIELDS
+                    if field != 'age' and customer.get(field) is not None and not isinstance(customer[field], str)]
+        if not_text:
+            raise TypeError(f"Field(s) must be strings: {', '.join(not_text)}")
+        values = {field: customer.get(field) for field in RECORD_FIELDS}
+        values['first_name'] = standardize_name(values['first_name'])
+        values['last_name'] = standardize_name(values['last_name'])
+        values['email'] = clean_email(values['email'])
+        if values['age'] is not None:
+            values['age'] = int(values['age'])
+        return values
+
+    def _row(self, golden_id, values):
+        now = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        return (golden_id, values['first_name'], values['last_name'], values['email'], now,
+                values['phone'], values['age'], values['country'], now)
+
+    def match(self, customer):
+        """Duplicate candidates for a record, without writing anything"""
+        started = time.perf_counter()
+        values = self._prepare(customer)
+        with self.lock:
+            self._refresh()
+            candidates = self._candidates(self._row(None, values))
+            elapsed = time.perf_counter() - started
+            self.stats['matches'] += 1
+            self.stats['seconds'] += elapsed
+        instrumentation.emit('realtime_match', candidates=len(candidates), ms=round(elapsed * 1000, 3))
+        return {'candidates': candidates, 'elapsed_ms': round(elapsed * 1000, 3)}
+
+    def upsert(self, customer, source_id=None):
+        """Insert (or update, for a known email) a golden record and log its candidates.
+
+        The golden record, its blocking_index rows and one match_history row
+        per candidate are written in one transaction; the clustering stage
+        merges them later like batch matches. Fields missing from an update
+        keep their stored values, and the resident indexes are rebuilt from
+        the row as written.
+        """
+        started = time.perf_counter()
+        values = self._prepare(customer)
+        with self.lock:
+            self._refresh()
+            # A record merged by clustering is updated through its survivor
+            existing = self.conn.execute('''SELECT COALESCE(s.golden_id, g.golden_id)
+                                            FROM golden_records g
+                                            LEFT JOIN golden_records s ON s.golden_id = g.merged_into AND s.is_active = 1
+                                            WHERE g.email = ? AND (g.is_active = 1 OR s.golden_id IS NOT NULL)''',
+                                         (values['email'],)).fetchone()
+            golden_id = existing[0] if existing else None
+            if existing:
+                stored = self.conn.execute(f"SELECT {', '.join(RECORD_FIELDS)} FROM golden_records WHERE golden_id = ?",
+                                           (golden_id,)).fetchone()
+                # The survivor keeps its own email
+                values = {field: old if values[field] is None or field == 'email' else values[field]
+                          for field, old in zip(RECORD_FIELDS, stored)}
+            score = QUALITY.score_batch([tuple(values[field] for field in RECORD_FIELDS)
+                                         + (self.source_system, source_id, 1.0)])[0]
+            # Looked up before writing; an updated record is excluded by its own id
+            candidates = self._candidates(self._row(golden_id, values))
+            with self.conn:
+                if existing:
+                    row = self.conn.execute(f'''UPDATE golden_records
+                                              SET first_name = ?, last_name = ?, phone = ?, age = ?, address = ?,
+                                                  city = ?, country = ?, data_quality_score = ?,
+                                                  updated_at = CURRENT_TIMESTAMP
+                                              WHERE golden_id = ?
+                                              RETURNING {LOAD_COLUMNS}''',
+                                           (values['first_name'], values['last_name'], values['phone'],
+                                            values['age'], values['address'], values['city'], values['country'],
+                                            score, golden_id)).fetchone()
+                else:
+                    row = self.conn.execute(f'''INSERT INTO golden_records
+                        (first_name, last_name, email, phone, age, address, city, country,
+                         source_system, source_id, confidence_score, data_quality_score)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1.0, ?)
+                        RETURNING {LOAD_COLUMNS}''',
+                        (*(values[field] for field in RECORD_FIELDS), self.source_system, source_id,
+                         score)).fetchone()
+                    golden_id = row[0]
+                self.conn.execute("DELETE FROM blocking_index WHERE golden_id = ?", (golden_id,))
+                self.conn.executemany("INSERT INTO blocking_index (key_name, key_value, golden_id) VALUES (?, ?, ?)",
+                                      blocking_entries([row[:5]]))
+                self.conn.execute("DELETE FROM exact_key_index WHERE golden_id = ?", (golden_id,))
+                self.conn.executemany("INSERT INTO exact_key_index (key_name, key_value, golden_id) VALUES (?, ?, ?)",
+                                      exact_key_entries([exact_key_row(row)]))
+                self.conn.executemany('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
+                                         VALUES (?, ?, ?, ?)''',
+                                      [(golden_id, match_type, candidate['score'], f"{golden_id},{candidate['golden_id']}")
+                                       for candidate in candidates for match_type in candidate['match_types']])
+            self._unindex(golden_id)
+            self._index(row)
+            elapsed = time.perf_counter() - started
+            self.stats['upserts'] += 1
+            self.stats['updated' if existing else 'created'] += 1
+            self.stats['seconds'] += elapsed
+        instrumentation.emit('realtime_upsert', golden_id=golden_id, created=not existing,
+                             candidates=len(candidates), ms=round(elapsed * 1000, 3))
+        return {'golden_id': golden_id, 'created': not existing, 'data_quality_score': score,
+                'candidates': candidates, 'elapsed_ms': round(elapsed * 1000, 3)}
+
+    def summary(self):
+        with self.lock:
+            requests = self.stats['matches'] + self.stats['upserts']
+            return {'records': len(self.records), 'load_seconds': round(self.load_seconds, 3),
+                    'mean_ms': round(self.stats['seconds'] / requests * 1000, 3) if requests else None,
+                    **{key: value for key, value in self.stats.items() if key != 'seconds'}}
+
+    def close(self):
+        self.conn.close()
+
+class MatchServiceHandler(BaseHTTPRequestHandler):
+    """POST /match and /upsert with a JSON customer record; GET /stats"""
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.service.summary())
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        handlers = {'/match': service.match, '/upsert': service.upsert}
+        if self.path not in handlers:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            customer = json.loads(self.rfile.read(length) or b'{}')
+            self._reply(200, handlers[self.path](customer))
+        except (ValueError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+        except sqlite3.IntegrityError as e:
+            # e.g. the email or source id belongs to a deactivated golden record
+            self._reply(409, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_match_server(service, host='127.0.0.1', port=DEFAULT_PORT):
+    """Serve ``service`` in a background thread; returns (server, url)"""
+    server = ThreadingHTTPServer((host, port), MatchServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GlobalFin real-time MDM matching service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default='mdm.db')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help="sorted-neighbourhood window size (0 disables)")
+    parser.add_argument('--max-block-size', type=int, default=DEFAULT_MAX_BLOCK_SIZE,
+                        help="ignore blocks larger than this")
+    parser.add_argument('--refresh-interval', type=float, default=DEFAULT_REFRESH_INTERVAL,
+                        help="seconds between checks for golden records changed by other stages")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        instrumentation.configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    service = MatchService(args.db, args.window, args.max_block_size, refresh_interval=args.refresh_interval)
+    server, url = start_match_server(service, args.host, args.port)
+    print(f"Indexed {len(service.records)} active golden records in {service.load_seconds:.2f}s")
+    print(f"Matching service listening on {url} (POST /match, POST /upsert, GET /stats)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        service.close()
@@ -3,14 +3,440 @@ GlobalFin Customer 360 Platform - MDM Matching Engine
 Simulates duplicate detection and identity resolution
 """
 
-import sqlite3
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from difflib import SequenceMatcher
 
+import instrumentation
+from quality import print_report
+from scorers import SCORERS, get_scorer
+from transformation import QUALITY, QUALITY_RULES
+
+# Dutch surname prefixes (tussenvoegsels) ignored when building blocking keys
+NAME_PREFIXES = {'van', 'de', 'der', 'den', 'het', 'ter', 'ten', 'te', 'in', "'t", 'op', 'la', 'le', 'du'}
+
+SOUNDEX_CODES = {}
+for letters, code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = code
+
+DEFAULT_WINDOW = 5
+DEFAULT_MAX_BLOCK_SIZE = 500
+MATCH_THRESHOLD = 0.8
+SCORING_CHUNK_SIZE = 5000
+MATCH_HISTORY_BATCH_SIZE = 1000
+
+# Scorer per name field (see scorers.SCORERS)
+DEFAULT_FIELD_SCORERS = {'first_name': 'sequence', 'last_name': 'sequence'}
+
+# Records shared with pool workers once, instead of pickled with every chunk
+_worker_records = None
+_worker_field_scorers = None
+
 def similarity(a, b):
     """Calculate string similarity (0-1)"""
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-def match_duplicates():
+def surname_core(last_name):
+    """Strip Dutch prefixes ("van der Berg" -> "berg")"""
+    parts = last_name.lower().split()
+    while len(parts) > 1 and parts[0] in NAME_PREFIXES:
+        parts = parts[1:]
+    return ''.join(parts)
+
+def soundex(name):
+    """Phonetic Soundex code (letter + 3 digits)"""
+    letters = [ch for ch in name.lower() if ch.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for ch in letters[1:]:
+        digit = SOUNDEX_CODES.get(ch, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if ch not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+def soundex_key(record):
+    """Blocking key: phonetic code of the surname"""
+    return soundex(surname_core(record[2])) or None
+
+def initial_length_key(record):
+    """Blocking key: surname first letter plus length bucket"""
+    core = surname_core(record[2])
+    if not core:
+        return None
+    return f"{core[0]}{len(core) // 3}"
+
+def sort_key(record):
+    """Sorting key for the sorted-neighbourhood window"""
+    return (surname_core(record[2]), record[1].lower(), record[0])
+
+# Pluggable blocking keys: name -> function(record) returning a key (or None)
+BLOCKING_KEYS = {
+    'soundex': soundex_key,
+    'initial_length': initial_length_key,
+}
+
+def generate_candidate_pairs(records, keys=('soundex', 'initial_length'),
+                             window=DEFAULT_WINDOW, max_block_size=DEFAULT_MAX_BLOCK_SIZE):
+    """Return sorted (i, j) index pairs worth scoring, plus blocking statistics.
+
+    Records are (golden_id, first_name, last_name, ...) tuples. Candidates are the
+    union of all pairs sharing a blocking key and all pairs within ``window``
+    positions of each other after sorting by name. Blocks larger than
+    ``max_block_size`` are skipped and left to the sorted neighbourhood.
+    """
+    candidates = set()
+    oversized_blocks = 0
+
+    for key_name in keys:
+        key_func = BLOCKING_KEYS[key_name]
+        blocks = defaultdict(list)
+        for index, record in enumerate(records):
+            key = key_func(record)
+            if key is not None:
+                blocks[key].append(index)
+        for members in blocks.values():
+            if len(members) > max_block_size:
+                oversized_blocks += 1
+                continue
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    candidates.add((members[a], members[b]))
+
+    if window and window > 1:
+        order = sorted(range(len(records)), key=lambda index: sort_key(records[index]))
+        for position, index in enumerate(order):
+            for other in order[position + 1:position + window]:
+                candidates.add((index, other) if index < other else (other, index))
+
+    total = len(records)
+    stats = {
+        'pairs_possible': total * (total - 1) // 2,
+        'pairs_considered': len(candidates),
+        'oversized_blocks': oversized_blocks,
+    }
+    return sorted(candidates), stats
+
+def sort_value(record):
+    """Persisted form of sort_key (ties are broken by golden_id in SQL)"""
+    return f"{surname_core(record[2])}\t{record[1].lower()}"
+
+def blocking_entries(records):
+    """Yield blocking_index rows (key_name, key_value, golden_id) for records"""
+    for record in records:
+        for key_name, key_func in BLOCKING_KEYS.items():
+            key = key_func(record)
+            if key is not None:
+                yield (key_name, key, record[0])
+        yield ('sorted', sort_value(record), record[0])
+
+# Mailbox providers that ignore dots in the local part
+DOTLESS_EMAIL_DOMAINS = {'gmail.com': 'gmail.com', 'googlemail.com': 'gmail.com'}
+COUNTRY_CALLING_CODES = {'Netherlands': '31', 'Belgium': '32', 'Germany': '49', 'France': '33',
+                         'United Kingdom': '44'}
+DEFAULT_CALLING_CODE = '31'
+EXACT_FETCH_SIZE = 10000
+
+def canonical_email(email):
+    """Lowercase, drop +tags (and dots for Gmail): "J.Doe+x@GMail.com" -> "jdoe@gmail.com" """
+    if not email or '@' not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    local = local.split('+', 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        domain = DOTLESS_EMAIL_DOMAINS[domain]
+        local = local.replace('.', '')
+    return f"{local}@{domain}" if local else None
+
+def e164_phone(phone, country=None):
+    """E.164 form of a free-text phone number ("06-12345678" -> "+31612345678")"""
+    if not phone:
+        return None
+    # Drop extensions and the "(0)" trunk prefix written after country codes
+    number = re.split(r'\s*(?:x|ext\.?)\s*\d+$', phone.strip().lower())[0].replace('(0)', '')
+    digits = re.sub(r'\D', '', number)
+    if number.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = COUNTRY_CALLING_CODES.get(country, DEFAULT_CALLING_CODE) + digits[1:]
+    else:
+        return None
+    return f"+{digits}" if 8 <= len(digits) <= 15 else None
+
+def name_birth_year_key(record):
+    """Normalized full name plus birth year (record year minus age)"""
+    _, _, _, first_name, last_name, age, _, created_at = record
+    if age is None or not created_at or not first_name or not last_name:
+        return None
+    return f"{first_name.strip().lower()}|{surname_core(last_name)}|{int(created_at[:4]) - age}"
+
+# Exact-match keys over (golden_id, email, phone, first_name, last_name, age,
+# country, created_at) rows: name -> (match_type, function(record) -> key or None)
+EXACT_KEYS = {
+    'email': ('exact_email', lambda record: canonical_email(record[1])),
+    'phone': ('exact_phone', lambda record: e164_phone(record[2], record[6])),
+    'name_birth_year': ('exact_name_birth_year', name_birth_year_key),
+}
+
+EXACT_ROW_QUERY = '''SELECT golden_id, email, phone, first_name, last_name, age, country, created_at
+                     FROM golden_records WHERE is_active = 1'''
+
+def exact_key_entries(rows, keys=tuple(EXACT_KEYS)):
+    """Yield exact_key_index rows (key_name, key_value, golden_id) for exact-key rows"""
+    funcs = [(key_name, EXACT_KEYS[key_name][1]) for key_name in keys]
+    for record in rows:
+        for key_name, key_func in funcs:
+            key = key_func(record)
+            if key is not None:
+                yield (key_name, key, record[0])
+
+def exact_match_groups(cursor, keys=tuple(EXACT_KEYS), index_cursor=None):
+    """Stream golden_records once, hashing every record under each exact key.
+
+    Returns {key_name: [golden_id list, ...]} for keys shared by two or more
+    records. Groups come straight out of the hash tables; nothing is sorted.
+    With ``index_cursor`` the persisted exact_key_index is rebuilt in the
+    same pass, for later incremental runs.
+    """
+    tables = {key_name: {} for key_name in keys}
+    if index_cursor is not None:
+        index_cursor.execute("DELETE FROM exact_key_index")
+    cursor.execute(EXACT_ROW_QUERY)
+    while True:
+        rows = cursor.fetchmany(EXACT_FETCH_SIZE)
+        if not rows:
+            break
+        entries = list(exact_key_entries(rows, keys))
+        for key_name, key, golden_id in entries:
+            table = tables[key_name]
+            members = table.get(key)
+            if members is None:
+                # Singletons stay a bare id; most keys never repeat
+                table[key] = golden_id
+            elif isinstance(members, list):
+                members.append(golden_id)
+            else:
+                table[key] = [members, golden_id]
+        if index_cursor is not None:
+            index_cursor.executemany("INSERT INTO exact_key_index (key_name, key_value, golden_id) VALUES (?, ?, ?)",
+                                     entries)
+    return {key_name: [members for members in table.values() if isinstance(members, list)]
+            for key_name, table in tables.items()}
+
+def indexed_exact_groups(cursor, delta_ids, keys=tuple(EXACT_KEYS)):
+    """Exact-key groups for a delta, looked up in the persisted exact_key_index.
+
+    Only the delta's own keys are read (indexed lookups), so the cost follows
+    the size of the delta. The delta's index entries are replaced as well.
+    Every group returned contains at least one delta record.
+    """
+    ids = sorted(delta_ids)
+    rows = []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor.execute(f"{EXACT_ROW_QUERY} AND golden_id IN ({','.join('?' * len(chunk))})", chunk)
+        rows.extend(cursor.fetchall())
+    cursor.executemany("DELETE FROM exact_key_index WHERE golden_id = ?", [(golden_id,) for golden_id in ids])
+
+    entries = list(exact_key_entries(rows, keys))
+    delta_members = defaultdict(list)
+    for key_name, key, golden_id in entries:
+        delta_members[(key_name, key)].append(golden_id)
+    groups = {key_name: [] for key_name in keys}
+    for (key_name, key), members in delta_members.items():
+        cursor.execute("SELECT golden_id FROM exact_key_index WHERE key_name = ? AND key_value = ?", (key_name, key))
+        members = sorted(set(members).union(row[0] for row in cursor.fetchall()))
+        if len(members) > 1:
+            groups[key_name].append(members)
+    cursor.executemany("INSERT INTO exact_key_index (key_name, key_value, golden_id) VALUES (?, ?, ?)", entries)
+    return groups
+
+def exact_group_labels(groups):
+    """golden_id -> one label per key, for skipping pairs already matched exactly"""
+    labels = {}
+    for key_index, key_groups in enumerate(groups.values()):
+        for group_index, members in enumerate(key_groups):
+            for golden_id in members:
+                labels.setdefault(golden_id, {})[key_index] = group_index
+    return labels
+
+def matched_exactly(labels, id1, id2):
+    first, second = labels.get(id1), labels.get(id2)
+    if not first or not second:
+        return False
+    return any(second.get(key_index) == group_index for key_index, group_index in first.items())
+
+def load_watermark(cursor):
+    """Return (last_updated_at, last_golden_id) of the previous run, or None"""
+    cursor.execute("SELECT last_updated_at, last_golden_id FROM match_watermark WHERE id = 1")
+    return cursor.fetchone()
+
+def save_watermark(cursor, records, previous=None):
+    """Advance the watermark to the newest (updated_at, golden_id) processed.
+
+    updated_at has one-second resolution, so the ids processed within the
+    watermark's own second are kept in match_watermark_seen; the next run
+    re-reads that second and skips only those ids.
+    """
+    newest = max(((record[4], record[0]) for record in records), default=previous)
+    if newest is None:
+        return
+    seen = [(record[0],) for record in records if record[4] == newest[0]]
+    if previous is None or previous[0] != newest[0]:
+        cursor.execute("DELETE FROM match_watermark_seen")
+    cursor.executemany("INSERT OR IGNORE INTO match_watermark_seen (golden_id) VALUES (?)", seen)
+    cursor.execute('''INSERT OR REPLACE INTO match_watermark (id, last_updated_at, last_golden_id, last_run)
+                      VALUES (1, ?, ?, CURRENT_TIMESTAMP)''', newest)
+
+def fetch_delta(cursor, watermark):
+    """Golden records created or updated since the watermark.
+
+    The boundary is inclusive: rows sharing the watermark's second are
+    returned unless they were already processed in that second.
+    """
+    last_updated_at, _ = watermark
+    cursor.execute('''SELECT golden_id, first_name, last_name, email, updated_at FROM golden_records
+                      WHERE updated_at >= ? AND is_active = 1
+                        AND NOT (updated_at = ? AND golden_id IN (SELECT golden_id FROM match_watermark_seen))
+                      ORDER BY golden_id''', (last_updated_at, last_updated_at))
+    return cursor.fetchall()
+
+def update_blocking_index(cursor, records, rebuild=False):
+    """Replace the persisted blocking keys of the given records"""
+    if rebuild:
+        cursor.execute("DELETE FROM blocking_index")
+    else:
+        cursor.executemany("DELETE FROM blocking_index WHERE golden_id = ?",
+                           [(record[0],) for record in records])
+    cursor.executemany("INSERT INTO blocking_index (key_name, key_value, golden_id) VALUES (?, ?, ?)",
+                       blocking_entries(records))
+
+def indexed_candidates(cursor, delta, keys=('soundex', 'initial_length'),
+                       window=DEFAULT_WINDOW, max_block_size=DEFAULT_MAX_BLOCK_SIZE):
+    """Candidate pairs for a delta, looked up in the persisted blocking index.
+
+    Delta records are paired with each other in memory and with previously
+    indexed records through the blocking_index table, so the cost follows the
+    size of the delta. Returns (records, pairs, stats) where records holds the
+    delta followed by the indexed records it is paired with.
+    """
+    delta_ids = {record[0] for record in delta}
+    update_ids = [(golden_id,) for golden_id in delta_ids]
+    # Drop stale keys of updated records before looking up neighbours
+    cursor.executemany("DELETE FROM blocking_index WHERE golden_id = ?", update_ids)
+
+    neighbours = defaultdict(set)
+    oversized_blocks = 0
+    for position, record in enumerate(delta):
+        for key_name in keys:
+            key = BLOCKING_KEYS[key_name](record)
+            if key is None:
+                continue
+            cursor.execute("SELECT golden_id FROM blocking_index WHERE key_name = ? AND key_value = ? LIMIT ?",
+                           (key_name, key, max_block_size + 1))
+            members = [row[0] for row in cursor.fetchall()]
+            if len(members) > max_block_size:
+                oversized_blocks += 1
+                continue
+            neighbours[position].update(members)
+
+        if window and window > 1:
+            value = sort_value(record)
+            cursor.execute('''SELECT golden_id FROM blocking_index
+                              WHERE key_name = 'sorted' AND (key_value, golden_id) < (?, ?)
+                              ORDER BY key_value DESC, golden_id DESC LIMIT ?''',
+                           (value, record[0], window - 1))
+            neighbours[position].update(row[0] for row in cursor.fetchall())
+            cursor.execute('''SELECT golden_id FROM blocking_index
+                              WHERE key_name = 'sorted' AND (key_value, golden_id) > (?, ?)
+                              ORDER BY key_value, golden_id LIMIT ?''',
+                           (value, record[0], window - 1))
+            neighbours[position].update(row[0] for row in cursor.fetchall())
+
+    indexed_ids = sorted(set().union(*neighbours.values()) - delta_ids) if neighbours else []
+    indexed_records = []
+    for start in range(0, len(indexed_ids), 500):
+        chunk = indexed_ids[start:start + 500]
+        cursor.execute(f'''SELECT golden_id, first_name, last_name, email, updated_at FROM golden_records
+                           WHERE is_active = 1 AND golden_id IN ({','.join('?' * len(chunk))})''', chunk)
+        indexed_records.extend(cursor.fetchall())
+    indexed_records.sort()
+
+    records = list(delta) + indexed_records
+    position_of = {record[0]: position for position, record in enumerate(records)}
+    pairs, delta_stats = generate_candidate_pairs(delta, keys, window, max_block_size)
+    candidates = set(pairs)
+    for position, golden_ids in neighbours.items():
+        for golden_id in golden_ids:
+            # Ids missing from position_of were merged away since they were indexed
+            if golden_id not in delta_ids and golden_id in position_of:
+                candidates.add((position, position_of[golden_id]))
+
+    cursor.execute("SELECT COUNT(*) FROM golden_records WHERE is_active = 1")
+    total = cursor.fetchone()[0]
+    changed = len(delta)
+    stats = {
+        'pairs_possible': changed * (total - changed) + changed * (changed - 1) // 2,
+        'pairs_considered': len(candidates),
+        'oversized_blocks': oversized_blocks + delta_stats['oversized_blocks'],
+    }
+    return records, sorted(candidates), stats
+
+def score_chunk(records, pairs, field_scorers=None):
+    """Score a chunk of candidate pairs, returning (i, j, similarity) matches"""
+    field_scorers = field_scorers or DEFAULT_FIELD_SCORERS
+    # A field below this cannot lift the two-field average over the threshold
+    cutoff = max(0.0, 2 * MATCH_THRESHOLD - 1)
+    first_scores = get_scorer(field_scorers['first_name'])(
+        [(records[i][1], records[j][1]) for i, j in pairs], cutoff)
+    last_scores = get_scorer(field_scorers['last_name'])(
+        [(records[i][2], records[j][2]) for i, j in pairs], cutoff)
+
+    matches = []
+    for (i, j), first_sim, last_sim in zip(pairs, first_scores, last_scores):
+        name_sim = (first_sim + last_sim) / 2
+        if name_sim > MATCH_THRESHOLD and records[i][0] != records[j][0]:
+            matches.append((i, j, name_sim))
+    return matches
+
+def _init_scoring_worker(records, field_scorers):
+    global _worker_records, _worker_field_scorers
+    _worker_records = records
+    _worker_field_scorers = field_scorers
+
+def _score_chunk_in_worker(pairs):
+    return score_chunk(_worker_records, pairs, _worker_field_scorers)
+
+def score_candidates(records, pairs, workers=1, chunk_size=SCORING_CHUNK_SIZE, field_scorers=None):
+    """Yield match chunks for the candidate pairs, in candidate order.
+
+    With ``workers > 1`` the chunks are sharded across a process pool; results
+    are streamed back in submission order, so the output is identical to the
+    serial path.
+    """
+    chunks = (pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size))
+    if workers <= 1 or len(pairs) <= chunk_size:
+        for chunk in chunks:
+            yield score_chunk(records, chunk, field_scorers)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                             initargs=(records, field_scorers)) as executor:
+        yield from executor.map(_score_chunk_in_worker, chunks)
+
+@instrumentation.instrumented('matching')
+def match_duplicates(keys=('soundex', 'initial_length'), window=DEFAULT_WINDOW,
+                     max_block_size=DEFAULT_MAX_BLOCK_SIZE, workers=1, field_scorers=None,
+                     incremental=False):
     print("=" * 60)
     print("GlobalFin Customer 360 - MDM Matching Engine")
     print("=" * 60)
@@ -18,77 +444,120 @@ def match_duplicates():
     print("Running identity resolution and duplicate detection...")
     print()
     
-    conn = sqlite3.connect('mdm.db')
+    conn = instrumentation.connect('mdm.db')
     c = conn.cursor()
     
-    # Find exact email duplicates
-    print("[1/3] Checking for exact email matches...")
-    c.execute('''SELECT email, COUNT(*) as count FROM golden_records 
-                 GROUP BY email HAVING count > 1''')
-    email_duplicates = c.fetchall()
-    
-    if email_duplicates:
-        print(f"   ⚠ Found {len(email_duplicates)} duplicate emails:")
-        for dup in email_duplicates[:5]:  # Show first 5
-            print(f"      • {dup[0]}: {dup[1]} records")
+    # Exact matches on normalized keys, before the expensive fuzzy stage
+    print("[1/3] Checking for exact matches (email, phone, name + birth year)...")
+    watermark = load_watermark(c) if incremental else None
+    if watermark:
+        # Incremental runs look up the delta's keys instead of rescanning
+        delta = fetch_delta(c, watermark)
+        exact_groups = indexed_exact_groups(c, {record[0] for record in delta})
     else:
-        print("   ✓ No exact email duplicates found")
+        exact_groups = exact_match_groups(conn.cursor(), index_cursor=c)
+    exact_history = []
+    for key_name, groups in exact_groups.items():
+        match_type = EXACT_KEYS[key_name][0]
+        exact_history.extend((members[0], match_type, 1.0, ','.join(map(str, members))) for members in groups)
+        instrumentation.count(f"{match_type}_groups", len(groups))
+        if groups:
+            print(f"   ⚠ {key_name}: {len(groups)} groups, {sum(map(len, groups))} records")
+        else:
+            print(f"   ✓ {key_name}: no exact duplicates")
+    if exact_history:
+        instrumentation.record_batch(len(exact_history))
+        c.executemany('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
+                         VALUES (?, ?, ?, ?)''', exact_history)
+    exact_labels = exact_group_labels(exact_groups)
     
     # Find fuzzy name matches
     print()
     print("[2/3] Checking for fuzzy name matches...")
-    c.execute("SELECT golden_id, first_name, last_name, email FROM golden_records")
-    all_records = c.fetchall()
-    
+    if watermark:
+        print(f"   • Incremental run: {len(delta)} new or changed records since {watermark[0]}")
+        all_records, candidate_pairs, blocking_stats = indexed_candidates(c, delta, keys, window, max_block_size)
+    else:
+        c.execute("SELECT golden_id, first_name, last_name, email, updated_at FROM golden_records WHERE is_active = 1")
+        all_records = c.fetchall()
+        delta = all_records
+        candidate_pairs, blocking_stats = generate_candidate_pairs(all_records, keys, window, max_block_size)
+    if exact_labels:
+        before = len(candidate_pairs)
+        candidate_pairs = [(i, j) for i, j in candidate_pairs
+                           if not matched_exactly(exact_labels, all_records[i][0], all_records[j][0])]
+        blocking_stats['pairs_exact'] = before - len(candidate_pairs)
+    possible = blocking_stats['pairs_possible']
+    considered = blocking_stats['pairs_considered']
+    instrumentation.count('records', len(delta))
+    instrumentation.count('pairs_possible', possible)
+    instrumentation.count('pairs_considered', considered)
+    reduction = (1 - considered / possible) * 100 if possible else 0.0
+    print(f"   • Blocking keys: {', '.join(keys)} (window {window})")
+    print(f"   • Pairs considered: {considered} of {possible} possible ({reduction:.1f}% reduction)")
+    if blocking_stats.get('pairs_exact'):
+        print(f"   • Pairs already matched exactly, not scored: {blocking_stats['pairs_exact']}")
+    if blocking_stats['oversized_blocks']:
+        print(f"   • Oversized blocks skipped: {blocking_stats['oversized_blocks']}")
+
+    field_scorers = {**DEFAULT_FIELD_SCORERS, **(field_scorers or {})}
+    print(f"   • Scoring with {workers} worker(s): first_name={field_scorers['first_name']}, "
+          f"last_name={field_scorers['last_name']}")
+
     potential_matches = []
-    checked_pairs = set()
-    
-    for i, record1 in enumerate(all_records):
-        for record2 in all_records[i+1:]:
-            pair_key = tuple(sorted([record1[0], record2[0]]))
-            if pair_key in checked_pairs:
-                continue
-            checked_pairs.add(pair_key)
-            
-            name_sim = (similarity(record1[1], record2[1]) + similarity(record1[2], record2[2])) / 2
-            
-            if name_sim > 0.8 and record1[0] != record2[0]:
-                potential_matches.append({
-                    'id1': record1[0],
-                    'id2': record2[0],
-                    'name1': f"{record1[1]} {record1[2]}",
-                    'name2': f"{record2[1]} {record2[2]}",
-                    'similarity': name_sim
-                })
-    
+    history_batch = []
+
+    for chunk_matches in score_candidates(all_records, candidate_pairs, workers,
+                                           field_scorers=field_scorers):
+        for i, j, name_sim in chunk_matches:
+            record1, record2 = all_records[i], all_records[j]
+            potential_matches.append({
+                'id1': record1[0],
+                'id2': record2[0],
+                'name1': f"{record1[1]} {record1[2]}",
+                'name2': f"{record2[1]} {record2[2]}",
+                'similarity': name_sim
+            })
+            history_batch.append((record1[0], 'fuzzy_name', name_sim, f"{record1[0]},{record2[0]}"))
+
+        # Log to match_history in batches
+        if len(history_batch) >= MATCH_HISTORY_BATCH_SIZE:
+            instrumentation.record_batch(len(history_batch))
+            c.executemany('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
+                             VALUES (?, ?, ?, ?)''', history_batch)
+            history_batch = []
+
+    if history_batch:
+        instrumentation.record_batch(len(history_batch))
+        c.executemany('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
+                         VALUES (?, ?, ?, ?)''', history_batch)
+
+    instrumentation.count('matches', len(potential_matches))
     if potential_matches:
         print(f"   ⚠ Found {len(potential_matches)} potential fuzzy matches:")
         for match in potential_matches[:5]:
             print(f"      • {match['name1']} ≈ {match['name2']} ({match['similarity']:.2%} match)")
-            
-            # Log to match_history
-            c.execute('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
-                         VALUES (?, ?, ?, ?)''',
-                      (match['id1'], 'fuzzy_name', match['similarity'], 
-                       f"{match['id1']},{match['id2']}"))
     else:
         print("   ✓ No fuzzy name matches found")
+
+    # Persist blocking keys and watermark for the next incremental run
+    update_blocking_index(c, delta, rebuild=not watermark)
+    save_watermark(c, delta, watermark)
     
-    # Data quality analysis
+    # Data quality over every active golden record, from the counts the
+    # quality_summary triggers keep current (no table scan)
     print()
     print("[3/3] Analyzing data quality...")
-    c.execute("SELECT AVG(data_quality_score), MIN(data_quality_score), MAX(data_quality_score) FROM golden_records")
-    avg_score, min_score, max_score = c.fetchone()
-    
-    c.execute("SELECT COUNT(*) FROM golden_records WHERE data_quality_score < 80")
-    low_quality_count = c.fetchone()[0]
+    report = QUALITY.summary_report(conn)
     
     conn.commit()
     conn.close()
     
-    print(f"   • Average Quality Score: {avg_score:.1f}/100")
-    print(f"   • Quality Range: {min_score}-{max_score}")
-    print(f"   • Low Quality Records: {low_quality_count}")
+    if report.records:
+        print(f"   • {report.records} active golden records scored")
+        print_report(report, QUALITY_RULES)
+    else:
+        print("   • No active golden records: run transformation.py first")
     
     print()
     print("=" * 60)
@@ -97,4 +566,33 @@ def match_duplicates():
     print()
 
 if __name__ == "__main__":
-    match_duplicates()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GlobalFin MDM Matching Engine")
+    parser.add_argument('--blocking', default='soundex,initial_length',
+                        help=f"comma-separated blocking keys ({', '.join(BLOCKING_KEYS)})")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help="sorted-neighbourhood window size (0 disables)")
+    parser.add_argument('--max-block-size', type=int, default=DEFAULT_MAX_BLOCK_SIZE,
+                        help="skip blocks larger than this")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes used to score candidate pairs")
+    parser.add_argument('--first-name-scorer', choices=list(SCORERS), default=DEFAULT_FIELD_SCORERS['first_name'])
+    parser.add_argument('--last-name-scorer', choices=list(SCORERS), default=DEFAULT_FIELD_SCORERS['last_name'])
+    parser.add_argument('--incremental', action='store_true',
+                        help="only score records created or updated since the last run")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        instrumentation.configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    blocking_keys = tuple(key for key in args.blocking.split(',') if key)
+    unknown = [key for key in blocking_keys if key not in BLOCKING_KEYS]
+    if unknown:
+        parser.error(f"unknown blocking key(s): {', '.join(unknown)}")
+
+    match_duplicates(blocking_keys, args.window, args.max_block_size, args.workers,
+                     {'first_name': args.first_name_scorer, 'last_name': args.last_name_scorer},
+                     args.incremental)
@@ -0,0 +1,136 @@
+"""
+GlobalFin Customer 360 Platform - AI Message Cache
+Content-addressed cache of generated messages, stored in cjop.db
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+DEFAULT_MAX_ENTRIES = 100000
+AGE_BAND_WIDTH = 10
+NAME_PLACEHOLDER = '[FIRST_NAME]'
+TOUCH_FLUSH_SIZE = 500
+
+def create_cache_table(conn):
+    """Create the message_cache table (called by setup_databases.py)"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS message_cache (
+        cache_key TEXT PRIMARY KEY,
+        message TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hit_count INTEGER DEFAULT 0
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_message_cache_last_used ON message_cache (last_used)")
+    # Entry count shared by every process using the cache, kept by triggers
+    conn.execute('''CREATE TABLE IF NOT EXISTS message_cache_size (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL
+    )''')
+    conn.execute("INSERT OR IGNORE INTO message_cache_size (id, entries) SELECT 1, COUNT(*) FROM message_cache")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS message_cache_size_insert AFTER INSERT ON message_cache
+                    BEGIN UPDATE message_cache_size SET entries = entries + 1; END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS message_cache_size_delete AFTER DELETE ON message_cache
+                    BEGIN UPDATE message_cache_size SET entries = entries - 1; END''')
+
+def cache_key(prompt, config):
+    """SHA-256 over the prompt and generation config"""
+    payload = json.dumps({'prompt': prompt, 'config': config}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def age_band(age, width=AGE_BAND_WIDTH):
+    """Age band label, e.g. 35 -> '30-39'"""
+    low = int(age) // width * width
+    return f"{low}-{low + width - 1}"
+
+def fill_template(message, first_name):
+    """Put the customer's name into a template-mode message"""
+    return message.replace(NAME_PLACEHOLDER, first_name)
+
+class MessageCache:
+    """SQLite-backed message cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, db_path='cjop.db', ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.conn = sqlite3.connect(db_path)
+        create_cache_table(self.conn)
+        self.conn.commit()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        # LRU timestamps of hits, written in batches rather than per lookup
+        self.pending_touches = {}
+
+    def size(self):
+        """Entries in the cache, across every process sharing the database"""
+        return self.conn.execute("SELECT entries FROM message_cache_size").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached message, or None on a miss or expired entry"""
+        row = self.conn.execute("SELECT message, created_at FROM message_cache WHERE cache_key = ?",
+                                (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            self.misses += 1
+            return None
+        if self.ttl and now - row[1] > self.ttl:
+            with self.conn:
+                self.conn.execute("DELETE FROM message_cache WHERE cache_key = ?", (key,))
+            self.expired += 1
+            self.misses += 1
+            return None
+        hits = self.pending_touches.get(key, (0, 0))[1]
+        self.pending_touches[key] = (now, hits + 1)
+        if len(self.pending_touches) >= TOUCH_FLUSH_SIZE:
+            self.flush()
+        self.hits += 1
+        return row[0]
+
+    def flush(self):
+        """Write pending LRU timestamps and hit counts"""
+        if not self.pending_touches:
+            return
+        with self.conn:
+            self.conn.executemany('''UPDATE message_cache SET last_used = ?, hit_count = hit_count + ?
+                                     WHERE cache_key = ?''',
+                                  [(used, hits, key) for key, (used, hits) in self.pending_touches.items()])
+        self.pending_touches = {}
+
+    def put(self, key, message):
+        """Store a message, evicting least recently used entries over the limit"""
+        now = time.time()
+        self.flush()
+        with self.conn:
+            cursor = self.conn.execute('''INSERT OR IGNORE INTO message_cache
+                                          (cache_key, message, created_at, last_used)
+                                          VALUES (?, ?, ?, ?)''', (key, message, now, now))
+            if not cursor.rowcount:
+                self.conn.execute('''UPDATE message_cache SET message = ?, created_at = ?, last_used = ?
+                                     WHERE cache_key = ?''', (message, now, now, key))
+            # The shared count, read inside the write transaction, covers
+            # entries added by other journey workers too
+            overflow = self.size() - self.max_entries
+            if overflow > 0:
+                self.evicted += self.conn.execute('''DELETE FROM message_cache WHERE cache_key IN (
+                                                      SELECT cache_key FROM message_cache ORDER BY last_used LIMIT ?)''',
+                                                  (overflow,)).rowcount
+
+    def stats(self):
+        """Hit/miss counters for reporting"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'entries': self.size(),
+        }
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,195 @@
+"""
+GlobalFin Customer 360 Platform - Pipeline Runner
+Runs the pipeline stages as a DAG in one process, level by level; stages on
+the same level run concurrently
+"""
+
+import json
+import os
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+STATE_FILE = 'pipeline_state.json'
+
+Stage = namedtuple('Stage', ['name', 'description', 'depends_on', 'run'])
+
+# Stage modules are imported when their stage runs, so a stage with a missing
+# dependency (faker, requests) fails on its own instead of at startup.
+def _setup(options):
+    from setup_databases import create_databases
+    create_databases()
+
+def _activate(options):
+    from activate import generate_customer_data
+    generate_customer_data(options['customers'])
+
+def _transform(options):
+    from transformation import transform_source_to_mdm
+    transform_source_to_mdm(workers=options['workers'])
+
+def _match(options):
+    from matching import match_duplicates
+    match_duplicates(workers=options['workers'])
+
+def _cluster(options):
+    from clustering import cluster_duplicates
+    cluster_duplicates()
+
+def _sync(options):
+    from safecdpdata import sync_mdm_to_cdp
+    sync_mdm_to_cdp()
+
+def _orchestrate(options):
+    from cjop import orchestrate_customer_journey
+    orchestrate_customer_journey(options['age'])
+
+# CDP sync waits for clustering so merged-away records never reach the CDP,
+# which makes the demo stages a chain: every level holds a single stage
+STAGES = [
+    Stage('setup', "Database Setup", [], _setup),
+    Stage('activate', "Data Activation", ['setup'], _activate),
+    Stage('transform', "Data Transformation", ['activate'], _transform),
+    Stage('match', "MDM Matching", ['transform'], _match),
+    Stage('cluster', "Duplicate Clustering", ['match'], _cluster),
+    Stage('sync', "CDP Synchronization", ['cluster'], _sync),
+    Stage('orchestrate', "CJOP Orchestration", ['sync'], _orchestrate),
+]
+
+def stage_levels(stages):
+    """Group stages into levels; every stage's dependencies are in earlier levels"""
+    by_name = {stage.name: stage for stage in stages}
+    level_of = {}
+
+    def level(name, path=()):
+        if name in path:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + (name,))}")
+        if name not in level_of:
+            depends_on = by_name[name].depends_on
+            level_of[name] = 1 + max((level(dep, path + (name,)) for dep in depends_on), default=-1)
+        return level_of[name]
+
+    levels = []
+    for stage in stages:
+        index = level(stage.name)
+        while len(levels) <= index:
+            levels.append([])
+        levels[index].append(stage)
+    return levels
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_FILE):
+    with open(path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+def run_stage(stage, options):
+    """Run one stage; returns its result record (status, wall and CPU seconds)"""
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    result = {'started_at': datetime.now().isoformat(timespec='seconds')}
+    try:
+        stage.run(options)
+        result['status'] = 'completed'
+    except BaseException as e:
+        # SystemExit included: stage scripts exit() on missing dependencies
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        result['status'] = 'failed'
+        result['error'] = ''.join(traceback.format_exception_only(type(e), e)).strip()
+    result['wall_seconds'] = round(time.perf_counter() - started, 3)
+    # Thread CPU time: excludes child processes (--workers > 1)
+    result['cpu_seconds'] = round(time.thread_time() - cpu_started, 3)
+    return result
+
+def run_pipeline(options, stages=STAGES, interactive=False, resume=False, start_from=None,
+                 state_path=STATE_FILE):
+    """Run stages level by level; stages sharing a level run concurrently.
+
+    ``resume`` skips stages completed by the previous run; ``start_from``
+    skips every level before the named stage. Returns True on success.
+    """
+    previous = load_state(state_path)
+    levels = stage_levels(stages)
+    if start_from:
+        start_level = next((i for i, level in enumerate(levels) if any(s.name == start_from for s in level)), None)
+        if start_level is None:
+            raise ValueError(f"Unknown stage '{start_from}' (available: {', '.join(s.name for s in stages)})")
+    else:
+        start_level = 0
+
+    # Earlier completions are kept even when not resuming, so skipping
+    # stages with start_from does not make a later --resume rerun them
+    completed = {name: record for name, record in previous.items() if record.get('status') == 'completed'}
+    state = {}
+    for index, level in enumerate(levels):
+        pending = [stage for stage in level
+                   if index >= start_level and not (resume and stage.name in completed)]
+        for stage in level:
+            if stage not in pending:
+                state[stage.name] = completed.get(stage.name, {'status': 'skipped'})
+        if not pending:
+            continue
+
+        print(f"\n{'=' * 70}")
+        print(f"Level {index + 1}/{len(levels)}: {', '.join(stage.description for stage in pending)}")
+        print(f"{'=' * 70}\n")
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            results = list(executor.map(lambda stage: run_stage(stage, options), pending))
+        for stage, result in zip(pending, results):
+            state[stage.name] = result
+        save_state(state, state_path)
+
+        failed = [stage for stage, result in zip(pending, results) if result['status'] == 'failed']
+        if failed:
+            for stage in failed:
+                print(f"\n❌ Error in stage '{stage.name}': {state[stage.name]['error']}")
+            print(f"   Fix the problem and rerun with --resume to continue from '{failed[0].name}'.")
+            print_summary(stages, state)
+            return False
+
+        if interactive and index < len(levels) - 1:
+            print("\nPress Enter to continue to next step...")
+            input()
+
+    print_summary(stages, state)
+    return True
+
+def print_summary(stages, state):
+    print()
+    print("Stage Timings:")
+    for stage in stages:
+        record = state.get(stage.name, {})
+        status = record.get('status', 'not run')
+        if 'wall_seconds' in record:
+            print(f"  • {stage.name:<12} {status:<10} wall {record['wall_seconds']:8.2f}s   "
+                  f"cpu {record['cpu_seconds']:8.2f}s")
+        else:
+            print(f"  • {stage.name:<12} {status}")
+    print()
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run the GlobalFin pipeline in one process")
+    parser.add_argument('--customers', type=int, default=50, help="customers to generate")
+    parser.add_argument('--age', type=int, default=35, help="customer age for the orchestration stage")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes for transformation and matching")
+    parser.add_argument('--interactive', action='store_true', help="pause between levels")
+    parser.add_argument('--resume', action='store_true', help=f"skip stages completed in {STATE_FILE}")
+    parser.add_argument('--from', dest='start_from', help="skip every stage before this one")
+    args = parser.parse_args()
+
+    options = {'customers': args.customers, 'age': args.age, 'workers': args.workers}
+    try:
+        ok = run_pipeline(options, interactive=args.interactive, resume=args.resume, start_from=args.start_from)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(0 if ok else 1)
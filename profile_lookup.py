@@ -0,0 +1,266 @@
+"""
+GlobalFin Customer 360 Platform - CDP Profile Lookup Service
+Pooled, indexed read access to customer_profiles
+"""
+
+import queue
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CACHE_ENTRIES = 50000
+DEFAULT_VERSION_CHECK_INTERVAL = 1.0  # seconds
+
+PROFILE_COLUMNS = '''customer_id, first_name, last_name, email, segment,
+                     lifetime_value, risk_score, age, preferred_channel'''
+
+# Fixed SQL text, so each pooled connection's statement cache keeps them prepared
+LOOKUP_BY_CUSTOMER_ID = f"SELECT {PROFILE_COLUMNS} FROM customer_profiles WHERE customer_id = ?"
+LOOKUP_BY_EMAIL = f"SELECT {PROFILE_COLUMNS} FROM customer_profiles WHERE email = ? ORDER BY customer_id LIMIT 1"
+LOOKUP_BY_AGE = f"SELECT {PROFILE_COLUMNS} FROM customer_profiles WHERE age = ? ORDER BY customer_id LIMIT 1"
+LOOKUP_BY_AGE_BAND = f'''SELECT {PROFILE_COLUMNS} FROM customer_profiles
+                         WHERE age BETWEEN ? AND ? ORDER BY age, customer_id LIMIT ?'''
+
+def create_profile_indexes(conn):
+    """Indexes behind the lookups (called by setup_databases.py).
+
+    golden_id is already indexed through its UNIQUE constraint.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_age ON customer_profiles (age, customer_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_segment ON customer_profiles (segment)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_email ON customer_profiles (email)")
+
+def create_sync_versions_table(conn):
+    """Version stamps bumped by sync_mdm_to_cdp (called by setup_databases.py)"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS sync_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+def bump_profiles_version(conn):
+    """Mark every cached customer profile as stale"""
+    conn.execute('''INSERT INTO sync_versions (name, version) VALUES ('customer_profiles', 1)
+                    ON CONFLICT (name) DO UPDATE SET version = version + 1,
+                                                     updated_at = CURRENT_TIMESTAMP''')
+
+class ProfileRecord(namedtuple('ProfileRecord', ['customer_id', 'first_name', 'last_name', 'email', 'segment',
+                                                 'ltv', 'risk_score', 'age', 'preferred_channel'])):
+    """Tuple-backed profile (no per-instance dict) that also answers profile['field']"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+def row_to_profile(row):
+    """Profile record in the shape cjop.py expects"""
+    return ProfileRecord._make(row)
+
+class ProfileLookup:
+    """Pool of long-lived read-only connections to cdp.db"""
+
+    def __init__(self, db_path='cdp.db', pool_size=DEFAULT_POOL_SIZE):
+        self.pool = queue.Queue()
+        for _ in range(pool_size):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute("PRAGMA cache_size = -32000")
+            conn.execute("PRAGMA mmap_size = 268435456")
+            self.pool.put(conn)
+        self.pool_size = pool_size
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection"""
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def _fetch_one(self, sql, params):
+        with self.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return row_to_profile(row) if row else None
+
+    def by_customer_id(self, customer_id):
+        """Profile by primary key"""
+        return self._fetch_one(LOOKUP_BY_CUSTOMER_ID, (customer_id,))
+
+    def by_email(self, email):
+        """Profile by (normalized) email"""
+        return self._fetch_one(LOOKUP_BY_EMAIL, (email.lower().strip(),))
+
+    def by_age(self, age):
+        """First profile of exactly this age (the original cjop lookup)"""
+        return self._fetch_one(LOOKUP_BY_AGE, (age,))
+
+    def by_age_band(self, min_age, max_age, limit=100):
+        """Up to ``limit`` profiles with min_age <= age <= max_age"""
+        with self.connection() as conn:
+            rows = conn.execute(LOOKUP_BY_AGE_BAND, (min_age, max_age, limit)).fetchall()
+        return [row_to_profile(row) for row in rows]
+
+    def profiles_version(self):
+        """Current customer_profiles sync version (0 before the first sync)"""
+        with self.connection() as conn:
+            try:
+                row = conn.execute("SELECT version FROM sync_versions WHERE name = 'customer_profiles'").fetchone()
+            except sqlite3.OperationalError:
+                return 0
+        return row[0] if row else 0
+
+    def close(self):
+        for _ in range(self.pool_size):
+            self.pool.get().close()
+
+_MISSING = object()
+
+class ProfileCache:
+    """Bounded in-process LRU of ProfileRecords in front of a ProfileLookup.
+
+    Entries are dropped in bulk when the sync version in cdp.db changes; the
+    version is re-read at most every ``check_interval`` seconds, so a hit
+    normally costs no SQL at all.
+    """
+
+    def __init__(self, lookup, max_entries=DEFAULT_CACHE_ENTRIES,
+                 check_interval=DEFAULT_VERSION_CHECK_INTERVAL):
+        self.lookup = lookup
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self.version = lookup.profiles_version()
+        self.checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        version = self.lookup.profiles_version()
+        if version != self.version:
+            self.version = version
+            self.entries.clear()
+            self.invalidations += 1
+
+    def _get(self, key, load):
+        self._check_version()
+        profile = self.entries.get(key, _MISSING)
+        if profile is not _MISSING:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return profile
+        self.misses += 1
+        profile = load()
+        self.entries[key] = profile
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return profile
+
+    def by_customer_id(self, customer_id):
+        return self._get(('customer_id', customer_id), lambda: self.lookup.by_customer_id(customer_id))
+
+    def by_email(self, email):
+        email = email.lower().strip()
+        return self._get(('email', email), lambda: self.lookup.by_email(email))
+
+    def by_age(self, age):
+        return self._get(('age', age), lambda: self.lookup.by_age(age))
+
+    def by_age_band(self, min_age, max_age, limit=100):
+        """Not cached: band scans are for batch use"""
+        return self.lookup.by_age_band(min_age, max_age, limit)
+
+    def memory_bytes(self):
+        """Approximate memory held by cached records, keys and the LRU index"""
+        total = sys.getsizeof(self.entries)
+        for key, profile in self.entries.items():
+            total += sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key)
+            if profile is not None:
+                total += sys.getsizeof(profile) + sum(sys.getsizeof(field) for field in profile)
+        return total
+
+    def stats(self):
+        """Hit rate and footprint, for sizing long-running workers"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'memory_bytes': self.memory_bytes(),
+            'version': self.version,
+        }
+
+    def close(self):
+        self.lookup.close()
+
+def benchmark(lookup, samples=5000):
+    """Latency percentiles (ms) of each lookup over sampled keys"""
+    with lookup.connection() as conn:
+        keys = conn.execute('''SELECT customer_id, email, age FROM customer_profiles
+                               ORDER BY random() LIMIT ?''', (samples,)).fetchall()
+    if not keys:
+        return {}
+
+    def percentiles(func, args):
+        timings = []
+        for arg in args:
+            start = time.perf_counter()
+            func(arg)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {'p50': timings[len(timings) // 2], 'p99': timings[int(len(timings) * 0.99)]}
+
+    return {
+        'customer_id': percentiles(lookup.by_customer_id, [key[0] for key in keys]),
+        'email': percentiles(lookup.by_email, [key[1] for key in keys]),
+        'age': percentiles(lookup.by_age, [key[2] for key in keys]),
+        'age_band': percentiles(lambda age: lookup.by_age_band(age, age + 9, 10), [key[2] for key in keys]),
+    }
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("GlobalFin Customer 360 - CDP Profile Lookup Benchmark")
+    print("=" * 60)
+    print()
+
+    cache = ProfileCache(ProfileLookup('cdp.db'))
+    results = benchmark(cache.lookup)
+
+    if not results:
+        print("   ❌ No customer profiles found; run safecdpdata.py first")
+    for name, latency in results.items():
+        print(f"  • by {name:<12} p50 {latency['p50']:.3f} ms   p99 {latency['p99']:.3f} ms")
+
+    if results:
+        # Warm the hot cache once, then time lookups it can serve
+        with cache.lookup.connection() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT customer_id FROM customer_profiles ORDER BY random() LIMIT 5000")]
+        for customer_id in ids:
+            cache.by_customer_id(customer_id)
+        start = time.perf_counter()
+        for customer_id in ids:
+            cache.by_customer_id(customer_id)
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+        print()
+        print(f"  • cached by customer_id  {elapsed / len(ids) * 1000:.4f} ms avg")
+        print(f"  • cache hit rate {stats['hit_rate']:.1%}, {stats['entries']:,} entries, "
+              f"~{stats['memory_bytes'] / 1024 / 1024:.1f} MB")
+    cache.close()
+    print()
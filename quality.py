@@ -0,0 +1,182 @@
+"""
+GlobalFin Customer 360 Platform - Data Quality Rules
+Declarative quality rules scored a batch at a time, with running statistics
+"""
+
+import json
+import re
+from collections import Counter, namedtuple
+
+MAX_SCORE = 100
+LOW_QUALITY_THRESHOLD = 80
+
+# A record fails a rule when CHECKS[check](value of field, arg) is false;
+# every failed rule takes ``penalty`` off MAX_SCORE
+Rule = namedtuple('Rule', ['name', 'description', 'field', 'check', 'arg', 'penalty'])
+
+_NON_DIGITS = re.compile(r'[^0-9]')
+
+def digit_count(value):
+    return len(_NON_DIGITS.sub('', value)) if value else 0
+
+# Plain SQL (no Python function), so the summary triggers run on any connection
+_SQL_WITHOUT_DIGITS = "COALESCE({field}, '')"
+for _digit in '0123456789':
+    _SQL_WITHOUT_DIGITS = f"replace({_SQL_WITHOUT_DIGITS}, '{_digit}', '')"
+SQL_DIGIT_COUNT = f"(length(COALESCE({{field}}, '')) - length({_SQL_WITHOUT_DIGITS}))"
+
+# check name -> (Python predicate(value, arg), SQL template for the same test)
+CHECKS = {
+    'present': (lambda value, arg: bool(value), "COALESCE({field}, '') != ''"),
+    'min_digits': (lambda value, arg: digit_count(value) >= arg, SQL_DIGIT_COUNT + " >= {arg}"),
+}
+
+class QualityReport:
+    """Per-rule failure counts and a score histogram, merged across batches"""
+
+    def __init__(self, rule_names=()):
+        self.records = 0
+        self.failures = Counter({name: 0 for name in rule_names})
+        self.histogram = Counter()
+
+    def merge(self, other):
+        self.records += other.records
+        self.failures.update(other.failures)
+        self.histogram.update(other.histogram)
+        return self
+
+    def average(self):
+        return sum(score * n for score, n in self.histogram.items()) / self.records if self.records else None
+
+    def score_range(self):
+        return (min(self.histogram), max(self.histogram)) if self.histogram else (None, None)
+
+    def below(self, threshold=LOW_QUALITY_THRESHOLD):
+        return sum(n for score, n in self.histogram.items() if score < threshold)
+
+    def to_dict(self):
+        return {'records': self.records, 'failures': dict(self.failures),
+                'histogram': {str(score): n for score, n in sorted(self.histogram.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        report = cls()
+        report.records = data['records']
+        report.failures.update(data['failures'])
+        report.histogram.update({int(score): n for score, n in data['histogram'].items()})
+        return report
+
+class RuleSet:
+    """Rules compiled against a fixed row layout (tuple of field names)"""
+
+    def __init__(self, rules, fields):
+        self.rules = list(rules)
+        self.compiled = [(rule.name, fields.index(rule.field), CHECKS[rule.check][0], rule.arg, rule.penalty)
+                         for rule in self.rules]
+
+    def new_report(self):
+        return QualityReport(rule.name for rule in self.rules)
+
+    def score_batch(self, rows, report=None):
+        """Scores for a batch of rows, evaluating every rule in one pass.
+
+        Failure counts and the score histogram are added to ``report``.
+        """
+        compiled = self.compiled
+        failures = Counter()
+        histogram = Counter()
+        scores = []
+        for row in rows:
+            score = MAX_SCORE
+            for name, index, check, arg, penalty in compiled:
+                if not check(row[index], arg):
+                    score -= penalty
+                    failures[name] += 1
+            scores.append(score)
+            histogram[score] += 1
+        if report is not None:
+            report.records += len(scores)
+            report.failures.update(failures)
+            report.histogram.update(histogram)
+        return scores
+
+    def sql_failures(self, qualifier=''):
+        """One SQL expression per rule, 1 when a row fails it"""
+        return [f"(NOT ({CHECKS[rule.check][1].format(field=qualifier + rule.field, arg=rule.arg)}))"
+                for rule in self.rules]
+
+    def sql_score(self, qualifier=''):
+        """SQL expression for the score; same result as score_batch"""
+        penalties = ''.join(f" - {rule.penalty} * {failure}"
+                            for rule, failure in zip(self.rules, self.sql_failures(qualifier)))
+        return f"{MAX_SCORE}{penalties}"
+
+    def sql_failure_key(self, qualifier=''):
+        """SQL expression for the failed-rule flags as text, e.g. '0,1,0'"""
+        return " || ',' || ".join(self.sql_failures(qualifier))
+
+    def create_summary(self, conn, table='golden_records', summary='quality_summary'):
+        """Keep ``summary`` (failed-rule flags -> active records) current with triggers.
+
+        Inserts, updates and deletes on ``table`` adjust the counts of active
+        rows (is_active = 1) as they happen, so a table-wide report never needs
+        a scan. The counts are rebuilt from ``table`` here, and the triggers are
+        recreated so they follow the current rules.
+        """
+        new_key, old_key = self.sql_failure_key('NEW.'), self.sql_failure_key('OLD.')
+        columns = ', '.join(dict.fromkeys(['is_active'] + [rule.field for rule in self.rules]))
+        add = f'''INSERT INTO {summary} (failed, records) SELECT {new_key}, 1 WHERE NEW.is_active = 1
+                   ON CONFLICT (failed) DO UPDATE SET records = records + 1;'''
+        remove = f"UPDATE {summary} SET records = records - 1 WHERE OLD.is_active = 1 AND failed = {old_key};"
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {summary} (failed TEXT PRIMARY KEY, records INTEGER NOT NULL)")
+        self.drop_summary_triggers(conn, summary)
+        for name, event, body in (('insert', 'INSERT', add), ('update', f'UPDATE OF {columns}', remove + add),
+                                  ('delete', 'DELETE', remove)):
+            conn.execute(f"CREATE TRIGGER {summary}_{name} AFTER {event} ON {table} BEGIN {body} END")
+        conn.execute(f"DELETE FROM {summary}")
+        conn.execute(f'''INSERT INTO {summary} (failed, records)
+                        SELECT {self.sql_failure_key()}, COUNT(*) FROM {table} WHERE is_active = 1 GROUP BY 1''')
+
+    def drop_summary_triggers(self, conn, summary='quality_summary'):
+        """Stop maintaining ``summary`` per row, e.g. around a full reload that
+        calls create_summary afterwards (one GROUP BY instead of a trigger per row)"""
+        for name in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {summary}_{name}")
+
+    def summary_report(self, conn, summary='quality_summary'):
+        """QualityReport of the active rows counted in ``summary`` (see create_summary)"""
+        return self.report_from_failure_counts(
+            [(*map(int, failed.split(',')), records)
+             for failed, records in conn.execute(f"SELECT failed, records FROM {summary} WHERE records > 0")])
+
+    def report_from_failure_counts(self, rows):
+        """QualityReport from (failed rule 1, ..., failed rule n, records) rows,
+        as returned by GROUP BY over sql_failures()"""
+        report = self.new_report()
+        for row in rows:
+            *failed, n = row
+            score = MAX_SCORE - sum(rule.penalty for rule, flag in zip(self.rules, failed) if flag)
+            for rule, flag in zip(self.rules, failed):
+                if flag:
+                    report.failures[rule.name] += n
+            report.histogram[score] += n
+            report.records += n
+        return report
+
+def save_report(conn, source, report):
+    """Keep a run's report in mdm.db quality_reports"""
+    with conn:
+        conn.execute("INSERT INTO quality_reports (source, records, report) VALUES (?, ?, ?)",
+                     (source, report.records, json.dumps(report.to_dict())))
+
+def print_report(report, rules, threshold=LOW_QUALITY_THRESHOLD, indent='   '):
+    low, high = report.score_range()
+    print(f"{indent}• Average Quality Score: {report.average():.1f}/100")
+    print(f"{indent}• Quality Range: {low}-{high}")
+    print(f"{indent}• Low Quality Records: {report.below(threshold)}")
+    for rule in rules:
+        failed = report.failures[rule.name]
+        share = failed / report.records if report.records else 0.0
+        print(f"{indent}• {rule.description}: {failed} failed ({share:.1%})")
+    histogram = ', '.join(f"{score}: {n}" for score, n in sorted(report.histogram.items(), reverse=True))
+    print(f"{indent}• Score Histogram: {histogram}")
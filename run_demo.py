@@ -3,45 +3,20 @@ GlobalFin Customer 360 Platform - Complete Demo Runner
 Executes all pipeline steps in sequence
 """
 
-import subprocess
 import sys
-import time
 
-def run_script(script_name, args=[]):
-    """Run a Python script and capture output"""
-    cmd = [sys.executable, script_name] + args
-    result = subprocess.run(cmd, capture_output=False, text=True)
-    return result.returncode == 0
+from pipeline import run_pipeline
 
-def main():
+def main(interactive=True, customers=50, age=35, resume=False):
     print("=" * 70)
     print("   GlobalFin Customer 360 Platform - Complete Pipeline Demo")
     print("=" * 70)
     print()
     
-    scripts = [
-        ("setup_databases.py", [], "Database Setup"),
-        ("activate.py", ["50"], "Data Activation (50 customers)"),
-        ("transformation.py", [], "Data Transformation"),
-        ("matching.py", [], "MDM Matching"),
-        ("safecdpdata.py", [], "CDP Synchronization"),
-        ("cjop.py", ["35"], "CJOP Orchestration (age 35)")
-    ]
-    
-    for i, (script, args, description) in enumerate(scripts, 1):
-        print(f"\n{'='*70}")
-        print(f"Step {i}/{len(scripts)}: {description}")
-        print(f"{'='*70}\n")
-        
-        success = run_script(script, args)
-        
-        if not success:
-            print(f"\n❌ Error in {script}. Stopping pipeline.")
-            sys.exit(1)
-        
-        if i < len(scripts):
-            print("\nPress Enter to continue to next step...")
-            input()
+    # All stages run in this process; see pipeline.py for the stage DAG
+    options = {'customers': customers, 'age': age, 'workers': 1}
+    if not run_pipeline(options, interactive=interactive, resume=resume):
+        sys.exit(1)
     
     print("\n" + "="*70)
     print("   ✅ Complete pipeline execution finished successfully!")
@@ -54,4 +29,12 @@ def main():
     print()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="GlobalFin complete pipeline demo")
+    parser.add_argument('--non-interactive', action='store_true', help="run every step without pausing")
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--age', type=int, default=35)
+    parser.add_argument('--resume', action='store_true', help="continue from the last failed step")
+    args = parser.parse_args()
+    main(not args.non_interactive, args.customers, args.age, args.resume)
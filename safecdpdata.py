@@ -3,8 +3,35 @@ GlobalFin Customer 360 Platform - CDP Data Synchronization
 Syncs golden records from MDM to CDP with enrichment
 """
 
-import sqlite3
 import random
+import time
+from collections import Counter
+
+import instrumentation
+from profile_lookup import bump_profiles_version
+from segmentation import (DEFAULT_COMPILED, MAX_AGE, compile_rules, load_rules, lookup,
+                          segment_criteria, segment_labels)
+from transformation import tune_connection
+
+# Optional: vectorized enrichment engine
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_BATCH_SIZE = 10000
+# sql runs the whole enrichment as one INSERT ... SELECT (storage.py)
+ENGINES = ('scalar', 'vectorized', 'sql')
+PRODUCT_BUNDLES = [
+    "Checking Account",
+    "Checking Account, Savings Account",
+    "Checking Account, Savings Account, Credit Card",
+    "Checking Account, Mortgage"
+]
+
+# The calculate_* functions below are the original hard-coded rules. They are
+# kept as the reference the rule-table engine (segmentation.DEFAULT_RULES) is
+# verified against; enrichment itself uses the compiled rules from cdp.db.
 
 def calculate_segment(age):
     """Determine customer segment based on age"""
@@ -26,17 +53,128 @@ def calculate_lifecycle_stage(age):
     else:
         return "Loyalty"
 
-def calculate_ltv(age, segment):
-    """Calculate estimated lifetime value"""
+def calculate_ltv(age, segment, noise=None):
+    """Calculate estimated lifetime value (noise defaults to a random 0-5000)"""
     base_ltv = age * 125
     segment_multiplier = {
         "Young Professional": 1.2,
         "Mid-Career Wealth Builder": 1.5,
         "Senior Wealth Management": 1.8
     }
-    return round(base_ltv * segment_multiplier.get(segment, 1.0) + random.randint(0, 5000), 2)
+    if noise is None:
+        noise = random.randint(0, 5000)
+    return round(base_ltv * segment_multiplier.get(segment, 1.0) + noise, 2)
+
+def calculate_preferred_channel(age):
+    """Preferred channel (based on age)"""
+    if age < 35:
+        return "Mobile App"
+    elif age < 55:
+        return "Email"
+    else:
+        return "Branch"
+
+def enrich_record(record, rules=DEFAULT_COMPILED):
+    """Build a customer_profiles row from a golden record using compiled rules"""
+    golden_id, first_name, last_name, email, age = record
+    
+    # Enrichment logic
+    segment = lookup(rules, 'segment', age)
+    lifecycle_stage = lookup(rules, 'lifecycle_stage', age)
+    ltv = round(age * 125 * lookup(rules, 'ltv_multiplier', age) + random.randint(0, 5000), 2)
+    risk_score = random.randint(70, 99)
+    propensity_score = round(random.uniform(0.3, 0.9), 2)
+    preferred_channel = lookup(rules, 'preferred_channel', age)
+    
+    # Product holdings (mock)
+    products = random.choice(PRODUCT_BUNDLES)
+    
+    return (golden_id, golden_id, first_name, last_name, email, age,
+            segment, lifecycle_stage, ltv, risk_score, propensity_score,
+            preferred_channel, products)
+
+def enrich_columns(ages, rng, rules=DEFAULT_COMPILED):
+    """Vectorized enrichment of an age array in one pass.
+
+    Rules are applied by indexing the compiled age lookup tables. Random
+    components come from ``rng`` (a numpy Generator) and the LTV noise is
+    returned as well, so results can be replayed against the scalar path.
+    """
+    ages = np.asarray(ages)
+    count = len(ages)
+    age_idx = np.clip(ages, 0, MAX_AGE)
+
+    ltv_noise = rng.integers(0, 5001, count)
+    base_ltv = ages * 125
+    ltv = np.round(base_ltv * np.asarray(rules['ltv_multiplier'])[age_idx] + ltv_noise, 2)
+
+    return {
+        'segment': np.asarray(rules['segment'], dtype=object)[age_idx],
+        'lifecycle_stage': np.asarray(rules['lifecycle_stage'], dtype=object)[age_idx],
+        'lifetime_value': ltv,
+        'ltv_noise': ltv_noise,
+        'risk_score': rng.integers(70, 100, count),
+        'propensity_score': np.round(rng.uniform(0.3, 0.9, count), 2),
+        'preferred_channel': np.asarray(rules['preferred_channel'], dtype=object)[age_idx],
+        'product_holdings': np.asarray(PRODUCT_BUNDLES, dtype=object)[rng.integers(0, len(PRODUCT_BUNDLES), count)],
+    }
+
+def enrich_batch_vectorized(golden_records, rng, rules=DEFAULT_COMPILED):
+    """Build customer_profiles rows for a batch with the vectorized engine"""
+    golden_ids, first_names, last_names, emails, ages = zip(*golden_records)
+    columns = enrich_columns(np.array(ages, dtype=np.int64), rng, rules)
+    return list(zip(golden_ids, golden_ids, first_names, last_names, emails, ages,
+                    columns['segment'].tolist(), columns['lifecycle_stage'].tolist(),
+                    columns['lifetime_value'].tolist(), columns['risk_score'].tolist(),
+                    columns['propensity_score'].tolist(), columns['preferred_channel'].tolist(),
+                    columns['product_holdings'].tolist()))
+
+def verify_enrichment(ages=range(18, 101), seed=0):
+    """Check the compiled default rules and the vectorized engine against the
+    scalar reference functions"""
+    ages = list(ages)
+    mismatches = 0
+    for age in ages:
+        expected = (calculate_segment(age), calculate_lifecycle_stage(age), calculate_preferred_channel(age))
+        actual = tuple(lookup(DEFAULT_COMPILED, dimension, age)
+                       for dimension in ('segment', 'lifecycle_stage', 'preferred_channel'))
+        if expected != actual:
+            mismatches += 1
+            print(f"   ⚠ Age {age}: scalar {expected} != rule table {actual}")
+
+    if np is None:
+        print("   ⚠ numpy not installed, vectorized engine not checked")
+        return mismatches == 0
+
+    columns = enrich_columns(np.array(ages), np.random.default_rng(seed))
+    for i, age in enumerate(ages):
+        segment = calculate_segment(age)
+        expected = (segment, calculate_lifecycle_stage(age), calculate_preferred_channel(age),
+                    calculate_ltv(age, segment, int(columns['ltv_noise'][i])))
+        actual = (columns['segment'][i], columns['lifecycle_stage'][i], columns['preferred_channel'][i],
+                  float(columns['lifetime_value'][i]))
+        if expected[:3] != actual[:3] or abs(expected[3] - actual[3]) > 0.005:
+            mismatches += 1
+            print(f"   ⚠ Age {age}: scalar {expected} != vectorized {actual}")
+    in_range = (columns['risk_score'].min() >= 70 and columns['risk_score'].max() <= 99 and
+                columns['propensity_score'].min() >= 0.3 and columns['propensity_score'].max() <= 0.9)
+    if not in_range:
+        print("   ⚠ Random components outside the scalar ranges")
+    return mismatches == 0 and in_range
 
-def sync_mdm_to_cdp():
+def remove_stale_profiles(mdm_cursor, cdp_conn, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete customer_profiles rows whose golden record is inactive or merged"""
+    mdm_cursor.execute("SELECT golden_id FROM golden_records WHERE is_active = 0 OR merged_into IS NOT NULL")
+    removed = 0
+    while True:
+        stale = mdm_cursor.fetchmany(batch_size)
+        if not stale:
+            return removed
+        with cdp_conn:
+            removed += cdp_conn.executemany("DELETE FROM customer_profiles WHERE golden_id = ?", stale).rowcount
+
+@instrumentation.instrumented('cdp_sync')
+def sync_mdm_to_cdp(batch_size=DEFAULT_BATCH_SIZE, engine='scalar', seed=None):
     print("=" * 60)
     print("GlobalFin Customer 360 - CDP Data Synchronization")
     print("=" * 60)
@@ -44,87 +182,123 @@ def sync_mdm_to_cdp():
     print("Syncing golden records from MDM to CDP...")
     print()
     
-    # Read from MDM
-    mdm_conn = sqlite3.connect('mdm.db')
+    mdm_conn = instrumentation.connect('mdm.db')
     mdm_cursor = mdm_conn.cursor()
-    mdm_cursor.execute("SELECT golden_id, first_name, last_name, email, age FROM golden_records WHERE is_active = 1")
-    golden_records = mdm_cursor.fetchall()
-    mdm_conn.close()
+    cdp_conn = instrumentation.connect('cdp.db')
+    tune_connection(cdp_conn)
+    cdp_cursor = cdp_conn.cursor()
     
-    print(f"[1/3] Retrieved {len(golden_records)} golden records from MDM")
+    if engine == 'vectorized' and np is None:
+        print("   ⚠ numpy not installed, falling back to the scalar engine")
+        engine = 'scalar'
+    rng = np.random.default_rng(seed) if engine == 'vectorized' else None
+    if engine == 'scalar' and seed is not None:
+        random.seed(seed)
     
-    # Write to CDP with enrichment
-    cdp_conn = sqlite3.connect('cdp.db')
-    cdp_cursor = cdp_conn.cursor()
+    # Rules are compiled once per run into age lookup tables
+    rules = load_rules('cdp.db')
+    compiled_rules = compile_rules(rules)
     
     synced_count = 0
+    segment_counts = Counter()
     
-    print("[2/3] Enriching and loading to CDP...")
+    if engine == 'sql':
+        print("[1/3] Joining golden records to the rule table inside SQLite...")
+    else:
+        print(f"[1/3] Streaming golden records from MDM in batches of {batch_size}...")
+    print(f"[2/3] Enriching and loading to CDP ({engine} engine)...")
+    start_time = time.perf_counter()
     
-    for record in golden_records:
-        golden_id, first_name, last_name, email, age = record
-        
-        # Enrichment logic
-        segment = calculate_segment(age)
-        lifecycle_stage = calculate_lifecycle_stage(age)
-        ltv = calculate_ltv(age, segment)
-        risk_score = random.randint(70, 99)
-        propensity_score = round(random.uniform(0.3, 0.9), 2)
-        
-        # Preferred channel (based on age)
-        if age < 35:
-            preferred_channel = "Mobile App"
-        elif age < 55:
-            preferred_channel = "Email"
-        else:
-            preferred_channel = "Branch"
-        
-        # Product holdings (mock)
-        products = random.choice([
-            "Checking Account",
-            "Checking Account, Savings Account",
-            "Checking Account, Savings Account, Credit Card",
-            "Checking Account, Mortgage"
-        ])
+    if engine == 'sql':
+        from storage import open_storage, sync_profiles
+        storage_conn = open_storage()
+        synced_count, sql_counts = sync_profiles(storage_conn, compiled_rules, PRODUCT_BUNDLES, seed)
+        storage_conn.close()
+        segment_counts.update(sql_counts)
+    else:
+        mdm_cursor.execute("SELECT golden_id, first_name, last_name, email, age FROM golden_records WHERE is_active = 1")
+        while True:
+            golden_records = mdm_cursor.fetchmany(batch_size)
+            if not golden_records:
+                break
+            instrumentation.record_batch(len(golden_records))
+            if engine == 'vectorized':
+                profiles = enrich_batch_vectorized(golden_records, rng, compiled_rules)
+            else:
+                profiles = [enrich_record(record, compiled_rules) for record in golden_records]
+            # Segment counts are kept in the same pass instead of rescanning customer_profiles
+            segment_counts.update(profile[6] for profile in profiles)
         
-        cdp_cursor.execute('''INSERT OR REPLACE INTO customer_profiles 
-                              (customer_id, golden_id, first_name, last_name, email, age, 
-                               segment, lifecycle_stage, lifetime_value, risk_score, 
-                               propensity_score, preferred_channel, product_holdings) 
-                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                           (golden_id, golden_id, first_name, last_name, email, age,
-                            segment, lifecycle_stage, ltv, risk_score, propensity_score,
-                            preferred_channel, products))
-        synced_count += 1
+            with cdp_conn:
+                cdp_cursor.executemany('''INSERT OR REPLACE INTO customer_profiles 
+                                          (customer_id, golden_id, first_name, last_name, email, age, 
+                                           segment, lifecycle_stage, lifetime_value, risk_score, 
+                                           propensity_score, preferred_channel, product_holdings) 
+                                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', profiles)
+            synced_count += len(profiles)
+        removed = remove_stale_profiles(mdm_cursor, cdp_conn, batch_size)
+        if removed:
+            print(f"   • Removed {removed} profiles of merged or inactive golden records")
+    
+    mdm_conn.close()
+    elapsed = time.perf_counter() - start_time
+    instrumentation.count('profiles', synced_count)
     
     # Update segment counts
     print("[3/3] Updating segment statistics...")
-    for segment_name in ["Young Professional", "Mid-Career Wealth Builder", "Senior Wealth Management"]:
-        cdp_cursor.execute("SELECT COUNT(*) FROM customer_profiles WHERE segment = ?", (segment_name,))
-        count = cdp_cursor.fetchone()[0]
-        cdp_cursor.execute('''INSERT OR REPLACE INTO customer_segments (segment_name, customer_count)
-                              VALUES (?, ?)''', (segment_name, count))
-    
-    cdp_conn.commit()
+    with cdp_conn:
+        criteria = segment_criteria(rules)
+        cdp_cursor.executemany('''INSERT INTO customer_segments (segment_name, segment_criteria, customer_count)
+                                  VALUES (?, ?, ?)
+                                  ON CONFLICT (segment_name) DO UPDATE SET
+                                      segment_criteria = excluded.segment_criteria,
+                                      customer_count = excluded.customer_count''',
+                               [(segment_name, criteria[segment_name], segment_counts[segment_name])
+                                for segment_name in segment_labels(rules)])
+        # Invalidate in-process profile caches (profile_lookup.ProfileCache) in bulk
+        bump_profiles_version(cdp_conn)
     cdp_conn.close()
     
+    rows_per_sec = synced_count / elapsed if elapsed > 0 else 0.0
     print()
     print("=" * 60)
     print(f"✅ Successfully synced {synced_count} customer profiles to CDP")
     print("=" * 60)
     print()
+    print(f"Throughput: {rows_per_sec:,.0f} profiles/sec ({elapsed:.2f}s)")
+    print()
     
     # Show segment distribution
-    cdp_conn = sqlite3.connect('cdp.db')
-    cdp_cursor = cdp_conn.cursor()
-    cdp_cursor.execute("SELECT segment, COUNT(*) FROM customer_profiles GROUP BY segment")
-    segments = cdp_cursor.fetchall()
-    cdp_conn.close()
-    
     print("Segment Distribution:")
-    for seg in segments:
-        print(f"  • {seg[0]}: {seg[1]} customers")
+    for segment_name, count in sorted(segment_counts.items(), key=lambda item: str(item[0])):
+        print(f"  • {segment_name or 'Unsegmented'}: {count} customers")
     print()
 
 if __name__ == "__main__":
-    sync_mdm_to_cdp()
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="GlobalFin CDP Data Synchronization")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="golden records per batch")
+    parser.add_argument('--engine', choices=ENGINES, default='scalar',
+                        help="enrichment engine (vectorized requires numpy; sql runs inside SQLite)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for the random enrichment components")
+    parser.add_argument('--verify', action='store_true',
+                        help="check the rule table and vectorized engine against the scalar functions and exit")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        instrumentation.configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.verify:
+        if verify_enrichment():
+            print("✅ Rule-table, vectorized and scalar enrichment agree")
+            sys.exit(0)
+        print("❌ Rule-table, vectorized and scalar enrichment disagree")
+        sys.exit(1)
+    
+    sync_mdm_to_cdp(args.batch_size, args.engine, args.seed)
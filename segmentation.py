@@ -0,0 +1,94 @@
+"""
+GlobalFin Customer 360 Platform - Segmentation Rules
+Data-driven segment, lifecycle, LTV and channel rules compiled to age lookups
+"""
+
+import json
+import sqlite3
+
+MAX_AGE = 130
+DIMENSIONS = ('segment', 'lifecycle_stage', 'preferred_channel')
+
+# Default rule set, seeded into cdp.db by setup_databases.py. Bounds are
+# inclusive; None means open-ended. When rules overlap, the highest priority
+# wins. Segment rules carry their LTV multiplier.
+DEFAULT_RULES = [
+    {'dimension': 'segment', 'label': 'Young Professional', 'age_min': None, 'age_max': 29, 'ltv_multiplier': 1.2},
+    {'dimension': 'segment', 'label': 'Mid-Career Wealth Builder', 'age_min': 30, 'age_max': 49, 'ltv_multiplier': 1.5},
+    {'dimension': 'segment', 'label': 'Senior Wealth Management', 'age_min': 50, 'age_max': None, 'ltv_multiplier': 1.8},
+    {'dimension': 'lifecycle_stage', 'label': 'Acquisition', 'age_min': None, 'age_max': 24},
+    {'dimension': 'lifecycle_stage', 'label': 'Growth', 'age_min': 25, 'age_max': 39},
+    {'dimension': 'lifecycle_stage', 'label': 'Retention', 'age_min': 40, 'age_max': 59},
+    {'dimension': 'lifecycle_stage', 'label': 'Loyalty', 'age_min': 60, 'age_max': None},
+    {'dimension': 'preferred_channel', 'label': 'Mobile App', 'age_min': None, 'age_max': 34},
+    {'dimension': 'preferred_channel', 'label': 'Email', 'age_min': 35, 'age_max': 54},
+    {'dimension': 'preferred_channel', 'label': 'Branch', 'age_min': 55, 'age_max': None},
+]
+
+def seed_default_rules(conn):
+    """Insert DEFAULT_RULES into segmentation_rules unless rules already exist"""
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM segmentation_rules")
+    if c.fetchone()[0]:
+        return
+    c.executemany('''INSERT INTO segmentation_rules (dimension, label, age_min, age_max, priority, ltv_multiplier)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  [(rule['dimension'], rule['label'], rule['age_min'], rule['age_max'],
+                    rule.get('priority', 0), rule.get('ltv_multiplier')) for rule in DEFAULT_RULES])
+
+def load_rules(db_path='cdp.db'):
+    """Read rules from cdp.db, falling back to DEFAULT_RULES"""
+    try:
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute('''SELECT dimension, label, age_min, age_max, priority, ltv_multiplier
+                     FROM segmentation_rules ORDER BY id''')
+        rows = c.fetchall()
+        conn.close()
+    except sqlite3.Error:
+        rows = []
+    if not rows:
+        return DEFAULT_RULES
+    return [{'dimension': row[0], 'label': row[1], 'age_min': row[2], 'age_max': row[3],
+             'priority': row[4] or 0, 'ltv_multiplier': row[5]} for row in rows]
+
+def compile_rules(rules):
+    """Compile rules into per-dimension lists indexed by age (0..MAX_AGE).
+
+    Evaluation cost is paid once here, so a lookup is a list index regardless
+    of how many rules exist. Ages no rule covers map to None (multiplier 1.0).
+    """
+    compiled = {dimension: [None] * (MAX_AGE + 1) for dimension in DIMENSIONS}
+    compiled['ltv_multiplier'] = [1.0] * (MAX_AGE + 1)
+    # Stable sort: equal priorities keep their declaration order, first wins
+    ordered = sorted(enumerate(rules), key=lambda item: (-(item[1].get('priority') or 0), item[0]))
+    for _, rule in ordered:
+        dimension = rule['dimension']
+        if dimension not in DIMENSIONS:
+            continue
+        low = max(rule['age_min'] if rule['age_min'] is not None else 0, 0)
+        high = min(rule['age_max'] if rule['age_max'] is not None else MAX_AGE, MAX_AGE)
+        for age in range(low, high + 1):
+            if compiled[dimension][age] is not None:
+                continue
+            compiled[dimension][age] = rule['label']
+            if dimension == 'segment':
+                multiplier = rule.get('ltv_multiplier')
+                compiled['ltv_multiplier'][age] = multiplier if multiplier is not None else 1.0
+    return compiled
+
+def lookup(compiled, dimension, age):
+    """O(1) rule lookup; ages are clamped to 0..MAX_AGE"""
+    return compiled[dimension][min(max(int(age), 0), MAX_AGE)]
+
+def segment_labels(rules):
+    """Segment names in declaration order"""
+    return [rule['label'] for rule in rules if rule['dimension'] == 'segment']
+
+def segment_criteria(rules):
+    """segment name -> JSON criteria, as stored in customer_segments.segment_criteria"""
+    return {rule['label']: json.dumps({'age_min': rule['age_min'], 'age_max': rule['age_max'],
+                                       'ltv_multiplier': rule.get('ltv_multiplier')})
+            for rule in rules if rule['dimension'] == 'segment'}
+
+DEFAULT_COMPILED = compile_rules(DEFAULT_RULES)
@@ -6,6 +6,22 @@ Creates all required database schemas for the demo
 import sqlite3
 from datetime import datetime
 
+from message_cache import create_cache_table
+from profile_lookup import create_profile_indexes, create_sync_versions_table
+from segmentation import seed_default_rules
+from transformation import QUALITY
+
+def add_missing_columns(conn, table, columns):
+    """Idempotent migration: add columns that an older copy of the table lacks.
+
+    CREATE TABLE IF NOT EXISTS leaves existing tables untouched, so every
+    column added to a schema after its first release is listed here too.
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
 def create_databases():
     print("=" * 60)
     print("GlobalFin Customer 360 Platform - Database Initialization")
@@ -29,13 +45,24 @@ def create_databases():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_crm_updated ON crm_customers (updated_at, id)")
+    # Keep updated_at current so the MDM sync can pick up changed rows
+    c.execute('''CREATE TRIGGER IF NOT EXISTS crm_customers_touch
+                 AFTER UPDATE ON crm_customers
+                 WHEN NEW.updated_at IS OLD.updated_at
+                 BEGIN
+                     UPDATE crm_customers SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+                 END''')
     
     c.execute('''CREATE TABLE IF NOT EXISTS source_metadata (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         source_name TEXT,
         last_sync TIMESTAMP,
-        record_count INTEGER
+        record_count INTEGER,
+        last_updated_at TIMESTAMP,
+        last_source_id INTEGER
     )''')
+    add_missing_columns(conn, 'source_metadata', [('last_updated_at', 'TIMESTAMP'), ('last_source_id', 'INTEGER')])
     conn.commit()
     conn.close()
     print("   ✓ Source Systems DB created")
@@ -59,9 +86,13 @@ def create_databases():
         confidence_score REAL DEFAULT 1.0,
         data_quality_score INTEGER DEFAULT 100,
         is_active BOOLEAN DEFAULT 1,
+        merged_into INTEGER,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    add_missing_columns(conn, 'golden_records', [('merged_into', 'INTEGER')])
+    # Running quality counts over active golden records, kept by triggers
+    QUALITY.create_summary(conn)
     
     c.execute('''CREATE TABLE IF NOT EXISTS match_history (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -72,6 +103,57 @@ def create_databases():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (golden_id) REFERENCES golden_records(golden_id)
     )''')
+    
+    # Name-only clusters wait here for a data steward instead of auto-merging
+    c.execute('''CREATE TABLE IF NOT EXISTS merge_review (
+        golden_id_1 INTEGER NOT NULL,
+        golden_id_2 INTEGER NOT NULL,
+        match_type TEXT,
+        match_score REAL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (golden_id_1, golden_id_2)
+    )''')
+    
+    c.execute('''CREATE TABLE IF NOT EXISTS blocking_index (
+        key_name TEXT NOT NULL,
+        key_value TEXT NOT NULL,
+        golden_id INTEGER NOT NULL,
+        FOREIGN KEY (golden_id) REFERENCES golden_records(golden_id)
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_blocking_key ON blocking_index (key_name, key_value, golden_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_blocking_golden_id ON blocking_index (golden_id)")
+    
+    # Normalized exact-match keys (see matching.EXACT_KEYS) for incremental runs
+    c.execute('''CREATE TABLE IF NOT EXISTS exact_key_index (
+        key_name TEXT NOT NULL,
+        key_value TEXT NOT NULL,
+        golden_id INTEGER NOT NULL,
+        FOREIGN KEY (golden_id) REFERENCES golden_records(golden_id)
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exact_key ON exact_key_index (key_name, key_value, golden_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exact_golden_id ON exact_key_index (golden_id)")
+    
+    c.execute('''CREATE TABLE IF NOT EXISTS quality_reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT,
+        records INTEGER,
+        report TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    
+    c.execute('''CREATE TABLE IF NOT EXISTS match_watermark (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_updated_at TIMESTAMP,
+        last_golden_id INTEGER,
+        last_run TIMESTAMP
+    )''')
+    # Ids already matched within the watermark's second (updated_at is whole seconds)
+    c.execute('''CREATE TABLE IF NOT EXISTS match_watermark_seen (
+        golden_id INTEGER PRIMARY KEY
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_golden_updated ON golden_records (updated_at, golden_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_golden_source ON golden_records (source_system, source_id)")
     conn.commit()
     conn.close()
     print("   ✓ MDM DB created")
@@ -97,8 +179,10 @@ def create_databases():
         last_interaction_date TIMESTAMP,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (golden_id) REFERENCES mdm.golden_records(golden_id)
+        FOREIGN KEY (golden_id) REFERENCES golden_records(golden_id)
     )''')
+    create_profile_indexes(conn)
+    create_sync_versions_table(conn)
     
     c.execute('''CREATE TABLE IF NOT EXISTS customer_segments (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -107,6 +191,18 @@ def create_databases():
         customer_count INTEGER DEFAULT 0
     )''')
     
+    # Segment, lifecycle, LTV and channel rules as data (see segmentation.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS segmentation_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dimension TEXT NOT NULL,
+        label TEXT NOT NULL,
+        age_min INTEGER,
+        age_max INTEGER,
+        priority INTEGER DEFAULT 0,
+        ltv_multiplier REAL
+    )''')
+    seed_default_rules(conn)
+    
     c.execute('''CREATE TABLE IF NOT EXISTS customer_interactions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         customer_id INTEGER,
@@ -169,8 +265,13 @@ def create_databases():
         journey_name TEXT,
         current_step TEXT,
         next_action TEXT,
+        claimed_by TEXT,
+        claimed_at REAL,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    add_missing_columns(conn, 'journey_states', [('claimed_by', 'TEXT'), ('claimed_at', 'REAL')])
+    # Claim queue for journey_worker.py: pending rows by step, oldest first
+    c.execute("CREATE INDEX IF NOT EXISTS idx_journey_step ON journey_states (current_step, id)")
     
     c.execute('''CREATE TABLE IF NOT EXISTS ab_tests (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -180,6 +281,7 @@ def create_databases():
         result TEXT,
         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    create_cache_table(conn)
     conn.commit()
     conn.close()
     print("   ✓ CJOP DB created")
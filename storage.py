@@ -0,0 +1,170 @@
+"""
+GlobalFin Customer 360 Platform - Unified Storage Layer
+One connection with every stage database attached, for set-based stages
+"""
+
+import random
+
+import instrumentation
+from segmentation import MAX_AGE
+from transformation import QUALITY, SOURCE_SYSTEM, clean_email, standardize_name
+
+# Schema alias -> database file. Table names are unique across the files, so
+# unqualified names still resolve (e.g. in transformation's watermark helpers).
+STAGE_DATABASES = {
+    'src': 'source-systems.db',
+    'mdm': 'mdm.db',
+    'cdp': 'cdp.db',
+    'dw': 'datawarehouse.db',
+    'cjop': 'cjop.db',
+}
+
+MASK64 = (1 << 64) - 1
+
+def seeded_random(seed, key, salt):
+    """Deterministic non-negative 63-bit integer for (seed, key, salt) (splitmix64)"""
+    x = (seed * 0x9E3779B97F4A7C15 + key * 0xBF58476D1CE4E5B9 + salt) & MASK64
+    x ^= x >> 30
+    x = (x * 0xBF58476D1CE4E5B9) & MASK64
+    x ^= x >> 27
+    x = (x * 0x94D049BB133111EB) & MASK64
+    x ^= x >> 31
+    return x >> 1
+
+def source_confidence(source_id):
+    """Same confidence score as transformation.transform_batch for this source id"""
+    return round(random.Random(source_id).uniform(0.85, 0.99), 3)
+
+def register_functions(conn):
+    """Python helpers the set-based statements call, all deterministic"""
+    conn.create_function('clean_email', 1, lambda email: clean_email(email) if email is not None else None,
+                         deterministic=True)
+    conn.create_function('standardize_name', 1, lambda name: standardize_name(name) if name is not None else None,
+                         deterministic=True)
+    conn.create_function('source_confidence', 1, source_confidence, deterministic=True)
+    conn.create_function('seeded_random', 3, seeded_random, deterministic=True)
+
+def open_storage(databases=STAGE_DATABASES):
+    """In-memory main schema with the stage databases attached and tuned"""
+    conn = instrumentation.connect(':memory:')
+    for alias, path in databases.items():
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        conn.execute(f"PRAGMA {alias}.journal_mode=WAL")
+        conn.execute(f"PRAGMA {alias}.synchronous=NORMAL")
+        conn.execute(f"PRAGMA {alias}.cache_size=-64000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    register_functions(conn)
+    return conn
+
+# crm_customers -> golden_records in one statement. Same rules as
+# transformation.transform_record and transformation.QUALITY_RULES; updates that would move a record onto an
+# email owned by another golden record are skipped, like load_batch does.
+TRANSFORM_CRM = f'''INSERT INTO mdm.golden_records
+                    (first_name, last_name, email, phone, age, address, city, country,
+                     source_system, source_id, confidence_score, data_quality_score)
+                    SELECT standardize_name(first_name), standardize_name(last_name), clean_email(email),
+                           phone, age, address, city, country, '{SOURCE_SYSTEM}', id, source_confidence(id),
+                           {QUALITY.sql_score()}
+                    FROM src.crm_customers
+                    WHERE :since IS NULL OR updated_at >= :since
+                    ORDER BY id
+                    ON CONFLICT (source_system, source_id) DO UPDATE SET
+                        first_name = excluded.first_name,
+                        last_name = excluded.last_name,
+                        email = excluded.email,
+                        phone = excluded.phone,
+                        age = excluded.age,
+                        address = excluded.address,
+                        city = excluded.city,
+                        country = excluded.country,
+                        data_quality_score = excluded.data_quality_score,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE (golden_records.first_name, golden_records.last_name, golden_records.email,
+                           golden_records.phone, golden_records.age, golden_records.address,
+                           golden_records.city, golden_records.country)
+                          IS NOT (excluded.first_name, excluded.last_name, excluded.email,
+                                  excluded.phone, excluded.age, excluded.address,
+                                  excluded.city, excluded.country)
+                      AND NOT EXISTS (SELECT 1 FROM mdm.golden_records other
+                                      WHERE other.email = excluded.email
+                                        AND other.golden_id != golden_records.golden_id)
+                    ON CONFLICT DO NOTHING'''
+
+def transform_crm(conn, watermark=None):
+    """Upsert CRM rows (all, or changed since ``watermark``) into golden_records.
+
+    Returns (rows extracted, rows written, newest (updated_at, id) or None,
+    QualityReport of the extracted rows).
+    """
+    params = {'since': watermark[0] if watermark else None}
+    # Counting the extracted rows per combination of failed rules gives the
+    # quality report in the same scan
+    failures = QUALITY.sql_failures()
+    report = QUALITY.report_from_failure_counts(conn.execute(
+        f"""SELECT {', '.join(failures)}, COUNT(*) FROM src.crm_customers
+            WHERE :since IS NULL OR updated_at >= :since
+            GROUP BY {', '.join(str(i + 1) for i in range(len(failures)))}""", params).fetchall())
+    extracted = report.records
+    changes_before = conn.total_changes
+    with conn:
+        conn.execute(TRANSFORM_CRM, params)
+    written = conn.total_changes - changes_before
+    newest = conn.execute('''SELECT updated_at, id FROM src.crm_customers
+                             WHERE :since IS NULL OR updated_at >= :since
+                             ORDER BY updated_at DESC, id DESC LIMIT 1''', params).fetchone()
+    return extracted, written, newest, report
+
+def load_age_rules(conn, compiled):
+    """Materialize compiled segmentation rules as temp.age_rules for joins"""
+    conn.execute("DROP TABLE IF EXISTS temp.age_rules")
+    conn.execute('''CREATE TEMP TABLE age_rules (
+        age INTEGER PRIMARY KEY, segment TEXT, lifecycle_stage TEXT,
+        preferred_channel TEXT, ltv_multiplier REAL)''')
+    conn.executemany("INSERT INTO temp.age_rules VALUES (?, ?, ?, ?, ?)",
+                     [(age, compiled['segment'][age], compiled['lifecycle_stage'][age],
+                       compiled['preferred_channel'][age], compiled['ltv_multiplier'][age])
+                      for age in range(MAX_AGE + 1)])
+
+def _draw(salt, seeded):
+    """SQL for a non-negative random integer per golden record"""
+    if seeded:
+        return f"seeded_random(:seed, g.golden_id, {salt})"
+    return "(random() & 9223372036854775807)"
+
+def sync_profiles(conn, compiled, product_bundles, seed=None):
+    """Enrich active golden records into customer_profiles in one statement.
+
+    Profiles left behind by deactivated or merged golden records are deleted
+    in the same transaction.
+
+    Rules come from a join on temp.age_rules; the random components have the
+    same ranges as safecdpdata.enrich_record and are reproducible with
+    ``seed``. Returns (profiles written, Counter-style segment counts).
+    """
+    load_age_rules(conn, compiled)
+    seeded = seed is not None
+    products = ' '.join(f"WHEN {i} THEN '{bundle}'" for i, bundle in enumerate(product_bundles))
+    age_join = f"LEFT JOIN temp.age_rules r ON r.age = MIN(MAX(g.age, 0), {MAX_AGE})"
+    with conn:
+        # Profiles of deactivated or merged golden records are dropped
+        conn.execute('''DELETE FROM cdp.customer_profiles
+                        WHERE golden_id IN (SELECT golden_id FROM mdm.golden_records
+                                            WHERE is_active = 0 OR merged_into IS NOT NULL)''')
+        changes_before = conn.total_changes
+        conn.execute(f'''INSERT OR REPLACE INTO cdp.customer_profiles
+                         (customer_id, golden_id, first_name, last_name, email, age,
+                          segment, lifecycle_stage, lifetime_value, risk_score,
+                          propensity_score, preferred_channel, product_holdings)
+                         SELECT g.golden_id, g.golden_id, g.first_name, g.last_name, g.email, g.age,
+                                r.segment, r.lifecycle_stage,
+                                round(g.age * 125 * COALESCE(r.ltv_multiplier, 1.0) + {_draw(1, seeded)} % 5001, 2),
+                                70 + {_draw(2, seeded)} % 30,
+                                round(0.3 + ({_draw(3, seeded)} % 60001) / 100000.0, 2),
+                                r.preferred_channel,
+                                CASE {_draw(4, seeded)} % {len(product_bundles)} {products} END
+                         FROM mdm.golden_records g {age_join}
+                         WHERE g.is_active = 1''', {'seed': seed} if seeded else {})
+    written = conn.total_changes - changes_before
+    segment_counts = dict(conn.execute(f'''SELECT r.segment, COUNT(*) FROM mdm.golden_records g {age_join}
+                                           WHERE g.is_active = 1 GROUP BY r.segment''').fetchall())
+    return written, segment_counts
@@ -0,0 +1,83 @@
+"""
+GlobalFin Customer 360 Platform - Stub LLM Server
+Local stand-in for the Gemini API with simulated latency and rate limiting
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers generateContent POSTs with a canned Gemini-shaped response"""
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+
+        with server.lock:
+            server.request_count += 1
+            throttled = server.rng.random() < server.error_rate
+            if throttled:
+                server.throttled_count += 1
+
+        time.sleep(server.latency)
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', str(server.retry_after))
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}')
+            return
+
+        prompt = body.get('contents', [{}])[0].get('parts', [{}])[0].get('text', '')
+        name = prompt.split('- Name: ', 1)[1].split('\n', 1)[0] if '- Name: ' in prompt else 'customer'
+        payload = {'candidates': [{'content': {'parts': [{'text': f"Dear {name}, welcome to GlobalFin. (stub)"}]}}]}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency=0.2, error_rate=0.0, retry_after=0, seed=0):
+    """Start the stub in a background thread; returns (server, url).
+
+    ``error_rate`` is the fraction of requests answered with 429. Stop it with
+    server.shutdown().
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.throttled_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/stub:generateContent"
+    return server, url
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stub Gemini API for load testing")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.1, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.error_rate)
+    print(f"Stub Gemini API listening on {url}")
+    print(f"Run with: GEMINI_API_URL={url} python cjop.py --all")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,23 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The pipeline stages are top-level modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from setup_databases import create_databases
+
+@pytest.fixture
+def stage_dir(tmp_path, monkeypatch):
+    """Fresh stage databases in a temporary working directory"""
+    monkeypatch.chdir(tmp_path)
+    create_databases()
+    return tmp_path
+
+@pytest.fixture
+def mdm_conn(stage_dir):
+    conn = sqlite3.connect(stage_dir / 'mdm.db')
+    yield conn
+    conn.close()
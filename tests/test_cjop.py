@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+import cjop
+
+class FakeResponse:
+    def __init__(self, status_code, text=None, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        return {'candidates': [{'content': {'parts': [{'text': self.text}]}}]}
+
+class FakeSession:
+    """Stands in for requests.Session; answers prompts from a list of statuses"""
+
+    def __init__(self, statuses, text=f"Hello {cjop.NAME_PLACEHOLDER}"):
+        self.statuses = list(statuses)
+        self.text = text
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        with self.lock:
+            status = self.statuses[min(self.calls, len(self.statuses) - 1)]
+            self.calls += 1
+        return FakeResponse(status, self.text, {'Retry-After': '0'})
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(cjop, 'retry_delay', lambda attempt, retry_after=None: 0)
+
+def profile(first_name, age=35):
+    return {'first_name': first_name, 'age': age, 'segment': 'Established',
+            'ltv': 12000.0, 'risk_score': 80}
+
+def generate(profiles, session, **options):
+    stats = Counter()
+    results = asyncio.run(cjop.generate_ai_messages_async(profiles, rate_limit=1000, session=session,
+                                                          stats=stats, **options))
+    return results, stats
+
+def test_retries_rate_limited_requests():
+    session = FakeSession([429, 503, 200])
+    results, stats = generate([profile('Anna')], session)
+    assert results == [('Hello Anna', True)]
+    assert session.calls == 3
+    assert stats['retries'] == 2 and stats['success'] == 1
+
+def test_falls_back_after_retries_are_exhausted():
+    session = FakeSession([503])
+    results, stats = generate([profile('Bram')], session, max_retries=2)
+    message, api_success = results[0]
+    assert not api_success
+    assert message == cjop.generate_fallback_message('Bram', 'Established')
+    assert session.calls == 3 and stats['fallback'] == 1
+
+def test_non_retryable_status_is_not_retried():
+    session = FakeSession([400, 200])
+    results, stats = generate([profile('Cor')], session)
+    assert results[0][1] is False
+    assert session.calls == 1 and stats['http_400'] == 1
+
+def test_shared_template_prompts_share_one_request():
+    session = FakeSession([200])
+    names = ['Anna', 'Bram', 'Cor', 'Daan']
+    results, _ = generate([profile(name) for name in names], session, template_mode=True)
+    assert results == [(f"Hello {name}", True) for name in names]
+    assert session.calls == 1
+
+def test_token_bucket_limits_request_rate():
+    async def acquire_all(bucket, count):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(count):
+            await bucket.acquire()
+        return loop.time() - started
+
+    # Two tokens are available at once, the other three take 1/20s each
+    elapsed = asyncio.run(acquire_all(cjop.TokenBucket(20, capacity=2), 5))
+    assert elapsed >= 0.14
+
+def test_template_without_placeholder_is_not_served_or_cached(tmp_path):
+    cache = cjop.MessageCache(str(tmp_path / 'cjop.db'))
+    session = FakeSession([200], text="Hello Maria, great news!")
+    results, stats = generate([profile('Anna'), profile('Bram')], session, cache=cache, template_mode=True)
+    assert [api_success for _, api_success in results] == [False, False]
+    assert all('Maria' not in message for message, _ in results)
+    assert stats['no_placeholder'] == 1 and cache.size() == 0
+    cache.close()
+
+def test_personal_prompts_may_name_the_customer(tmp_path):
+    cache = cjop.MessageCache(str(tmp_path / 'cjop.db'))
+    session = FakeSession([200], text="Hello Anna, great news!")
+    results, _ = generate([profile('Anna')], session, cache=cache)
+    assert results == [("Hello Anna, great news!", True)] and cache.size() == 1
+    cache.close()
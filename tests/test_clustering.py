@@ -0,0 +1,105 @@
+import pytest
+
+from clustering import UnionFind, cluster_duplicates, merge_cluster
+
+# golden_id: (first_name, last_name, email, phone, city, data_quality_score)
+RECORDS = {
+    1: ('Jan', 'Jansen', 'jan@example.com', '+31612345678', None, 90),
+    2: ('Jan', 'Jansen', 'jan.jansen@example.com', '+31612345678', 'Utrecht', 80),
+    3: ('Jan', 'Janssen', 'jjanssen@example.com', '+31687654321', 'Utrecht', 100),
+    4: ('Piet', 'de Vries', 'piet@example.com', None, 'Delft', 100),
+    5: ('Piet', 'de Vries', 'pdv@example.com', None, 'Delft', 100),
+    6: ('Anna', 'Bakker', 'anna@example.com', '+31611111111', 'Leiden', 100),
+    7: ('Anna', 'Bakker', 'a.bakker@example.com', '+31611111111', 'Leiden', 70),
+    # One household number, two people
+    8: ('Kees', 'Smit', 'kees@example.com', '+31622222222', 'Gouda', 100),
+    9: ('Lotte', 'Smit', 'lotte@example.com', '+31622222222', 'Gouda', 100),
+    # Same mailbox, name written differently
+    10: ('Sanne', 'Visser', 's.visser@gmail.com', None, 'Zwolle', 100),
+    11: ('S', 'Visser-de Boer', 'svisser@gmail.com', None, None, 90),
+}
+
+@pytest.fixture
+def mdm(mdm_conn):
+    with mdm_conn:
+        mdm_conn.executemany('''INSERT INTO golden_records
+                                (golden_id, first_name, last_name, email, phone, city, data_quality_score)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                             [(golden_id, *values) for golden_id, values in RECORDS.items()])
+        mdm_conn.executemany("INSERT INTO blocking_index (key_name, key_value, golden_id) VALUES ('soundex', 'J525', ?)",
+                             [(1,), (2,), (3,)])
+        mdm_conn.executemany('''INSERT INTO match_history (golden_id, match_type, match_score, matched_records)
+                                VALUES (?, ?, ?, ?)''', [
+            (1, 'exact_phone', 1.0, '1,2'),
+            (6, 'exact_phone', 1.0, '6,7'),
+            (8, 'exact_phone', 1.0, '8,9'),
+            (10, 'exact_email', 1.0, '10,11'),
+            # Name-only links: one inside the phone cluster, two across records with no shared contact key
+            (1, 'fuzzy_name', 0.95, '1,2'),
+            (2, 'fuzzy_name', 0.92, '2,3'),
+            (4, 'exact_name_birth_year', 1.0, '4,5'),
+            (4, 'fuzzy_name', 0.5, '4,6'),
+        ])
+    return mdm_conn
+
+def active(conn):
+    return {golden_id for (golden_id,) in conn.execute("SELECT golden_id FROM golden_records WHERE is_active = 1")}
+
+def test_union_find_clusters():
+    forest = UnionFind()
+    forest.union(1, 2)
+    forest.union(3, 4)
+    forest.union(2, 4)
+    forest.find(5)
+    assert {tuple(sorted(members)) for members in forest.clusters().values()} == {(1, 2, 3, 4)}
+
+def test_merge_cluster_prefers_quality_and_fills_gaps():
+    records = [{'golden_id': golden_id, 'data_quality_score': score, 'confidence_score': 1.0,
+                'updated_at': '2026-01-01 00:00:00', 'phone': None, 'age': age, 'address': None,
+                'city': city, 'country': None}
+               for golden_id, score, age, city in [(1, 80, 40, 'Utrecht'), (2, 90, None, None)]]
+    survivor_id, filled, merged_ids = merge_cluster(records)
+    assert (survivor_id, merged_ids) == (2, [1])
+    assert filled == {'age': 40, 'city': 'Utrecht'}
+
+def test_survivor_prefers_the_later_update():
+    records = [{'golden_id': golden_id, 'data_quality_score': 100, 'confidence_score': 1.0,
+                'updated_at': updated_at, 'phone': None, 'age': None, 'address': None, 'city': None,
+                'country': None}
+               for golden_id, updated_at in [(1, '2026-01-01 10:00:00'), (2, '2026-01-01 10:00:00.500'),
+                                             (3, None)]]
+    assert merge_cluster(records)[0] == 2
+
+def test_only_confirmed_contact_matches_auto_merge(mdm):
+    cluster_duplicates()
+    assert active(mdm) == {1, 3, 4, 5, 6, 8, 9, 10}
+    merged = dict(mdm.execute("SELECT golden_id, merged_into FROM golden_records WHERE merged_into IS NOT NULL"))
+    # Shared phone with matching names, or a shared email
+    assert merged == {2: 1, 7: 6, 11: 10}
+    # The survivor took the city it was missing from the merged record
+    assert mdm.execute("SELECT city FROM golden_records WHERE golden_id = 1").fetchone() == ('Utrecht',)
+    assert mdm.execute("SELECT golden_id FROM blocking_index ORDER BY golden_id").fetchall() == [(1,), (3,)]
+
+def test_name_only_matches_go_to_review(mdm):
+    cluster_duplicates()
+    review = mdm.execute('''SELECT golden_id_1, golden_id_2, match_type, status FROM merge_review
+                            ORDER BY golden_id_1, golden_id_2''').fetchall()
+    # 2 ~ 3 is queued against 2's survivor; 1 ~ 2 was already merged on phone;
+    # 4 ~ 6 scored below the threshold; 8 and 9 share a phone but not a name
+    assert review == [(1, 3, 'fuzzy_name', 'pending'), (4, 5, 'exact_name_birth_year', 'pending'),
+                      (8, 9, 'exact_phone', 'pending')]
+
+def test_rerun_queues_nothing_new(mdm):
+    cluster_duplicates()
+    cluster_duplicates()
+    assert active(mdm) == {1, 3, 4, 5, 6, 8, 9, 10}
+    assert mdm.execute("SELECT COUNT(*) FROM merge_review").fetchone() == (3,)
+
+def test_dry_run_changes_nothing(mdm):
+    cluster_duplicates(dry_run=True)
+    assert active(mdm) == set(RECORDS)
+    assert mdm.execute("SELECT COUNT(*) FROM merge_review").fetchone() == (0,)
+
+def test_oversized_clusters_are_skipped(mdm):
+    cluster_duplicates(max_cluster_size=1)
+    assert active(mdm) == set(RECORDS)
@@ -0,0 +1,35 @@
+import pytest
+
+from safecdpdata import (DEFAULT_COMPILED, calculate_lifecycle_stage, calculate_preferred_channel,
+                         calculate_segment, enrich_record, verify_enrichment)
+
+np = pytest.importorskip('numpy')
+
+from safecdpdata import enrich_batch_vectorized, enrich_columns
+
+GOLDEN = [(i, f"First{i}", f"Last{i}", f"customer{i}@example.com", age)
+          for i, age in enumerate([18, 29, 30, 49, 50, 64, 65, 90, 120], start=1)]
+
+def test_rule_table_and_vectorized_engine_match_scalar_rules():
+    assert verify_enrichment()
+
+def test_vectorized_batch_matches_scalar_rules():
+    profiles = enrich_batch_vectorized(GOLDEN, np.random.default_rng(0))
+    scalar = [enrich_record(record, DEFAULT_COMPILED) for record in GOLDEN]
+    for profile, expected in zip(profiles, scalar):
+        assert profile[:6] == expected[:6]
+        # segment, lifecycle stage and preferred channel are rule lookups
+        assert (profile[6], profile[7], profile[11]) == (expected[6], expected[7], expected[11])
+        assert 70 <= profile[9] <= 99 and 0.3 <= profile[10] <= 0.9
+
+def test_vectorized_engine_is_reproducible():
+    ages = np.array([age for *_, age in GOLDEN])
+    first = enrich_columns(ages, np.random.default_rng(42))
+    second = enrich_columns(ages, np.random.default_rng(42))
+    assert first['lifetime_value'].tolist() == second['lifetime_value'].tolist()
+    assert first['product_holdings'].tolist() == second['product_holdings'].tolist()
+
+def test_scalar_reference_rules():
+    assert calculate_segment(29) != calculate_segment(30)
+    assert calculate_lifecycle_stage(40) == DEFAULT_COMPILED['lifecycle_stage'][40]
+    assert calculate_preferred_channel(70) == DEFAULT_COMPILED['preferred_channel'][70]
@@ -0,0 +1,119 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from match_service import MatchService, start_match_server
+
+CUSTOMER = {'first_name': 'jan', 'last_name': 'JANSEN', 'email': ' Jan@Example.com', 'phone': '+31612345678',
+            'age': 40, 'city': 'Utrecht', 'country': 'Netherlands'}
+
+@pytest.fixture
+def service(mdm_conn):
+    with mdm_conn:
+        mdm_conn.executemany('''INSERT INTO golden_records (golden_id, first_name, last_name, email, phone,
+                                                            is_active, merged_into)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''', [
+            (1, 'Piet', 'De Vries', 'piet@example.com', '+31611111111', 1, None),
+            (2, 'Piet', 'De Vries', 'pdv@example.com', '+31611111111', 0, 1),
+            (3, 'Kees', 'Smit', 'kees@example.com', None, 0, None),
+        ])
+    service = MatchService('mdm.db', refresh_interval=0)
+    yield service
+    service.close()
+
+@pytest.fixture
+def url(service):
+    server, url = start_match_server(service, port=0)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+def post(url, path, body):
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    request = urllib.request.Request(url + path, data=data, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_upsert_creates_then_updates(service):
+    created = service.upsert(CUSTOMER)
+    assert created['created'] and created['candidates'] == []
+    updated = service.upsert({**CUSTOMER, 'first_name': 'Johannes'})
+    assert not updated['created'] and updated['golden_id'] == created['golden_id']
+    assert service.summary()['records'] == 2
+
+def test_upsert_of_merged_email_updates_survivor(service, mdm_conn):
+    result = service.upsert({'first_name': 'Piet', 'last_name': 'de Vries', 'email': 'pdv@example.com'})
+    assert (result['golden_id'], result['created']) == (1, False)
+    assert mdm_conn.execute("SELECT COUNT(*) FROM golden_records").fetchone() == (3,)
+    # The survivor keeps its email and phone, in the database and in the resident index
+    assert mdm_conn.execute("SELECT email, phone FROM golden_records WHERE golden_id = 1").fetchone() == \
+        ('piet@example.com', '+31611111111')
+    assert service.records[1][3] == 'piet@example.com'
+    candidates = service.match({'first_name': 'X', 'last_name': 'Y', 'email': 'piet@example.com',
+                                'phone': '+31611111111', 'country': 'Netherlands'})['candidates']
+    assert [candidate['golden_id'] for candidate in candidates] == [1]
+    assert set(candidates[0]['match_types']) == {'exact_email', 'exact_phone'}
+
+def test_partial_update_keeps_stored_fields(service, mdm_conn):
+    service.upsert(CUSTOMER)
+    service.upsert({'first_name': 'Johannes', 'last_name': 'Jansen', 'email': 'jan@example.com'})
+    stored = mdm_conn.execute("SELECT first_name, phone, age, city FROM golden_records WHERE email = ?",
+                              ('jan@example.com',)).fetchone()
+    assert stored == ('Johannes', '+31612345678', 40, 'Utrecht')
+
+def test_match_finds_exact_phone_candidate(service):
+    result = service.match({'first_name': 'P', 'last_name': 'Vries', 'email': 'x@example.com',
+                            'phone': '+31611111111', 'country': 'Netherlands'})
+    assert [candidate['golden_id'] for candidate in result['candidates']] == [1]
+    assert 'exact_phone' in result['candidates'][0]['match_types']
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'"jan"', b'null', b'{not json'])
+def test_malformed_body_is_rejected(url, body):
+    status, payload = post(url, '/upsert', body)
+    assert status == 400 and 'error' in payload
+
+def test_upsert_maintains_exact_key_index(service, mdm_conn):
+    golden_id = service.upsert(CUSTOMER)['golden_id']
+    keys = dict(mdm_conn.execute("SELECT key_name, key_value FROM exact_key_index WHERE golden_id = ?", (golden_id,)))
+    assert keys['email'] == 'jan@example.com' and keys['phone'] == '+31612345678'
+
+def test_changes_by_other_writers_are_picked_up(service, mdm_conn):
+    # Clustering merges 1 away; another stage adds a record with the same phone
+    with mdm_conn:
+        mdm_conn.execute('''UPDATE golden_records SET is_active = 0, merged_into = 3,
+                            updated_at = datetime('now', '+1 second') WHERE golden_id = 1''')
+        mdm_conn.execute('''INSERT INTO golden_records (golden_id, first_name, last_name, email, phone, updated_at)
+                            VALUES (4, 'Pieter', 'Vries', 'pieter@example.com', '+31611111111',
+                                    datetime('now', '+1 second'))''')
+    result = service.match({'first_name': 'P', 'last_name': 'Vries', 'email': 'x@example.com',
+                            'phone': '+31611111111', 'country': 'Netherlands'})
+    assert [candidate['golden_id'] for candidate in result['candidates']] == [4]
+    assert 1 not in service.records
+
+@pytest.mark.parametrize('field, value', [('first_name', 42), ('email', ['jan@example.com']), ('phone', 612345678)])
+def test_non_string_fields_are_rejected(url, field, value):
+    status, payload = post(url, '/upsert', {**CUSTOMER, field: value})
+    assert status == 400 and field in payload['error']
+
+def test_missing_fields_are_rejected(url):
+    status, payload = post(url, '/match', {'first_name': 'Jan'})
+    assert status == 400
+    assert 'last_name' in payload['error'] and 'email' in payload['error']
+
+def test_email_of_deactivated_record_conflicts(url):
+    status, payload = post(url, '/upsert', {'first_name': 'Kees', 'last_name': 'Smit', 'email': 'kees@example.com'})
+    assert status == 409 and 'UNIQUE' in payload['error']
+
+def test_unknown_path(url):
+    assert post(url, '/merge', CUSTOMER)[0] == 404
+
+def test_stats(url):
+    assert post(url, '/match', CUSTOMER)[0] == 200
+    with urllib.request.urlopen(url + '/stats') as response:
+        stats = json.loads(response.read())
+    assert (stats['records'], stats['matches'], stats['upserts']) == (1, 1, 0)
@@ -0,0 +1,172 @@
+import itertools
+
+import pytest
+
+from matching import (BLOCKING_KEYS, canonical_email, e164_phone, exact_match_groups, fetch_delta,
+                      generate_candidate_pairs, indexed_exact_groups, load_watermark, match_duplicates,
+                      score_candidates, score_chunk, sort_key)
+
+# Surname spelling variants crossed with first-name variants: (golden_id, first_name, last_name)
+SURNAMES = ['Jansen', 'Janssen', 'de Vries', 'Vries', 'van der Berg', 'Bergh', 'Bakker', 'Backer', 'Visser',
+            'Vissers', 'Smit', 'Smith', 'Mulder', 'Mulders', 'de Boer', 'Boer', 'Kok', 'de Jong', 'Dijkstra',
+            'Hendriks']
+FIRST_NAMES = ['Jan', 'Johan', 'Piet', 'Pieter', 'Anna', 'Anne', 'Kees', 'Lotte', 'Sanne', 'Sanna']
+RECORDS = [(golden_id, first_name, last_name)
+           for golden_id, (last_name, first_name) in enumerate(itertools.product(SURNAMES, FIRST_NAMES), 1)]
+
+def all_pairs(records):
+    return list(itertools.combinations(range(len(records)), 2))
+
+@pytest.mark.parametrize('key_name', sorted(BLOCKING_KEYS))
+def test_blocking_key_pairs_every_record_sharing_it(key_name):
+    key_func = BLOCKING_KEYS[key_name]
+    expected = [(i, j) for i, j in all_pairs(RECORDS)
+                if key_func(RECORDS[i]) is not None and key_func(RECORDS[i]) == key_func(RECORDS[j])]
+    pairs, stats = generate_candidate_pairs(RECORDS, (key_name,), window=0)
+    assert pairs == expected
+    assert stats['oversized_blocks'] == 0
+
+def test_sorted_neighbourhood_pairs_records_within_the_window():
+    rank = {index: position for position, index in
+            enumerate(sorted(range(len(RECORDS)), key=lambda index: sort_key(RECORDS[index])))}
+    expected = [(i, j) for i, j in all_pairs(RECORDS) if abs(rank[i] - rank[j]) < 4]
+    assert generate_candidate_pairs(RECORDS, (), window=4)[0] == expected
+
+def test_candidates_keep_every_brute_force_match():
+    matches = {(i, j) for i, j, _ in score_chunk(RECORDS, all_pairs(RECORDS))}
+    pairs, stats = generate_candidate_pairs(RECORDS)
+    assert matches and matches <= set(pairs)
+    assert stats['pairs_considered'] < stats['pairs_possible'] // 4
+    # Soundex alone is not enough: "Visser" and "Vissers" get different codes
+    assert not matches <= set(generate_candidate_pairs(RECORDS, ('soundex',), window=0)[0])
+
+def test_oversized_blocks_are_left_to_the_window():
+    pairs, stats = generate_candidate_pairs(RECORDS, ('soundex',), window=0, max_block_size=10)
+    # Jansen and Janssen share one soundex block of 20 records; Kok has a block of its own
+    jansen, kok = SURNAMES.index('Jansen') * 10, SURNAMES.index('Kok') * 10
+    assert stats['oversized_blocks'] > 0
+    assert (jansen, jansen + 1) not in pairs and (kok, kok + 1) in pairs
+
+@pytest.mark.parametrize('field_scorers', [None, {'first_name': 'jaro_winkler', 'last_name': 'levenshtein'}])
+def test_parallel_scoring_matches_serial(field_scorers):
+    pairs = all_pairs(RECORDS)
+    serial = list(score_candidates(RECORDS, pairs, workers=1, chunk_size=1000, field_scorers=field_scorers))
+    parallel = list(score_candidates(RECORDS, pairs, workers=2, chunk_size=1000, field_scorers=field_scorers))
+    assert len(serial) == len(pairs) // 1000 + 1
+    assert parallel == serial and any(serial)
+
+def insert_golden(conn, records, updated_at='2026-01-01 10:00:00'):
+    with conn:
+        conn.executemany("INSERT INTO golden_records (golden_id, first_name, last_name, email, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [(golden_id, first_name, last_name, f"customer{golden_id}@example.com", updated_at)
+                          for golden_id, first_name, last_name in records])
+
+def fuzzy_pairs(conn):
+    pairs = [tuple(sorted(map(int, matched.split(',')))) for (matched,) in
+             conn.execute("SELECT matched_records FROM match_history WHERE match_type = 'fuzzy_name'")]
+    assert len(pairs) == len(set(pairs)), "a pair was scored twice"
+    return set(pairs)
+
+def test_incremental_runs_match_a_full_run(mdm_conn):
+    insert_golden(mdm_conn, RECORDS[:120])
+    match_duplicates(incremental=True)
+    insert_golden(mdm_conn, RECORDS[120:], updated_at='2026-01-01 10:00:05')
+    with mdm_conn:
+        # A changed surname moves record 3 into another block
+        mdm_conn.execute("UPDATE golden_records SET last_name = 'Smid', updated_at = '2026-01-01 10:00:05' "
+                         "WHERE golden_id = 3")
+    match_duplicates(incremental=True)
+    incremental = fuzzy_pairs(mdm_conn)
+
+    with mdm_conn:
+        mdm_conn.execute("DELETE FROM match_history")
+    match_duplicates()
+    full = fuzzy_pairs(mdm_conn)
+    # The incremental history also keeps pairs record 3 matched before its update
+    assert full <= incremental
+    assert {pair for pair in incremental - full if 3 not in pair} == set()
+    smit = next(golden_id for golden_id, first_name, last_name in RECORDS if (first_name, last_name) == ('Piet', 'Smit'))
+    assert (3, smit) in full
+
+def test_watermark_second_is_reread_without_repeats(mdm_conn):
+    insert_golden(mdm_conn, [(golden_id, 'Jan', 'Jansen') for golden_id in (2, 3)])
+    match_duplicates(incremental=True)
+    assert load_watermark(mdm_conn.cursor()) == ('2026-01-01 10:00:00', 3)
+    # Written in the same second as the watermark, with a lower id
+    insert_golden(mdm_conn, [(1, 'Jan', 'Janssen')])
+    assert [record[0] for record in fetch_delta(mdm_conn.cursor(), ('2026-01-01 10:00:00', 3))] == [1]
+    match_duplicates(incremental=True)
+    assert fuzzy_pairs(mdm_conn) == {(2, 3), (1, 2), (1, 3)}
+    match_duplicates(incremental=True)
+    assert fuzzy_pairs(mdm_conn) == {(2, 3), (1, 2), (1, 3)}
+
+@pytest.mark.parametrize('phone, country, expected', [
+    ('06-12345678', None, '+31612345678'),
+    ('+31 (0)6 1234 5678', None, '+31612345678'),
+    ('0031 6 12345678', None, '+31612345678'),
+    ('0612345678', 'Belgium', '+32612345678'),
+    ('+31 6 12345678 ext. 12', None, '+31612345678'),
+    ('612345678', None, None),
+    ('123', None, None),
+    ('', None, None),
+])
+def test_e164_phone(phone, country, expected):
+    assert e164_phone(phone, country) == expected
+
+@pytest.mark.parametrize('email, expected', [
+    ('J.Doe+x@GMail.com', 'jdoe@gmail.com'),
+    ('j.doe@googlemail.com', 'jdoe@gmail.com'),
+    (' Jan@Example.com ', 'jan@example.com'),
+    ('jan.de.vries+news@example.com', 'jan.de.vries@example.com'),
+    ('+news@example.com', None),
+    ('no-at-sign', None),
+    (None, None),
+])
+def test_canonical_email(email, expected):
+    assert canonical_email(email) == expected
+
+# golden_id: (first_name, last_name, email, phone, age, country, created_at)
+EXACT_RECORDS = {
+    1: ('Jan', 'Jansen', 'J.Jansen@gmail.com', '06-12345678', 40, 'Netherlands', '2026-01-01 10:00:00'),
+    2: ('Jan', 'Jansen', 'jjansen+shop@gmail.com', '+31 6 1234 5678', 41, 'Netherlands', '2027-01-01 10:00:00'),
+    3: ('Piet', 'de Vries', 'piet@example.com', '0612345678', 30, 'Belgium', '2026-01-01 10:00:00'),
+    4: ('piet', 'Vries', 'pdv@example.com', None, 31, 'Belgium', '2027-01-01 10:00:00'),
+    5: ('Anna', 'Bakker', 'anna@example.com', '123', None, 'Netherlands', '2026-01-01 10:00:00'),
+}
+
+def insert_exact(conn, records):
+    with conn:
+        conn.executemany('''INSERT INTO golden_records (golden_id, first_name, last_name, email, phone, age,
+                                                        country, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                         [(golden_id, *values) for golden_id, values in records.items()])
+
+def sorted_groups(groups):
+    return {key_name: sorted(sorted(members) for members in key_groups) for key_name, key_groups in groups.items()}
+
+def test_exact_match_groups(mdm_conn):
+    insert_exact(mdm_conn, EXACT_RECORDS)
+    assert sorted_groups(exact_match_groups(mdm_conn.cursor())) == {
+        'email': [[1, 2]],
+        'phone': [[1, 2]],
+        # Born in 1986 and 1996; "de" is dropped from the surname
+        'name_birth_year': [[1, 2], [3, 4]],
+    }
+
+def test_indexed_exact_groups_match_a_full_run(mdm_conn):
+    insert_exact(mdm_conn, EXACT_RECORDS)
+    with mdm_conn:
+        exact_match_groups(mdm_conn.cursor(), index_cursor=mdm_conn.cursor())
+    insert_exact(mdm_conn, {
+        6: ('Anna', 'Bakker', 'ANNA@example.com', None, None, 'Netherlands', '2026-01-01 10:00:00'),
+        7: ('Kees', 'Smit', 'kees@example.com', '+32 612 34 56 78', None, 'Belgium', '2026-01-01 10:00:00'),
+    })
+    with mdm_conn:
+        # A corrected phone moves record 5 into record 3's group
+        mdm_conn.execute("UPDATE golden_records SET phone = '0612345678', country = 'Belgium' WHERE golden_id = 5")
+        indexed = sorted_groups(indexed_exact_groups(mdm_conn.cursor(), {5, 6, 7}))
+    full = sorted_groups(exact_match_groups(mdm_conn.cursor()))
+    assert indexed == {key_name: [members for members in groups if {5, 6, 7} & set(members)]
+                       for key_name, groups in full.items()}
+    assert indexed['email'] == [[5, 6]] and indexed['phone'] == [[3, 5, 7]]
@@ -0,0 +1,25 @@
+from message_cache import MessageCache
+
+def test_size_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'cjop.db')
+    first, second = MessageCache(path, max_entries=3), MessageCache(path, max_entries=3)
+    first.put('a', 'A')
+    second.put('b', 'B')
+    assert first.size() == second.size() == 2
+    first.put('c', 'C')
+    second.put('d', 'D')
+    # One store over the limit: the least recently used entry goes
+    assert second.size() == 3 and second.evicted == 1
+    assert first.get('a') is None and first.get('d') == 'D'
+    first.close()
+    second.close()
+
+def test_replacing_and_expiring_keep_the_count(tmp_path):
+    cache = MessageCache(str(tmp_path / 'cjop.db'), ttl=1)
+    cache.put('a', 'A')
+    cache.put('a', 'A2')
+    assert cache.size() == 1 and cache.get('a') == 'A2'
+    cache.conn.execute("UPDATE message_cache SET created_at = created_at - 10")
+    assert cache.get('a') is None
+    assert cache.size() == 0 and cache.stats()['expired'] == 1
+    cache.close()
@@ -0,0 +1,49 @@
+import threading
+
+from pipeline import STAGES, Stage, load_state, run_pipeline, stage_levels
+
+def test_demo_stages_form_a_chain():
+    assert [[stage.name for stage in level] for level in stage_levels(STAGES)] == \
+        [[stage.name] for stage in STAGES]
+
+def test_stages_sharing_a_level_run_concurrently(tmp_path):
+    # Each side of the fork waits for the other, so running them one by one fails
+    barrier = threading.Barrier(2, timeout=5)
+    ran = []
+    stages = [
+        Stage('load', "Load", [], lambda options: ran.append('load')),
+        Stage('match', "Match", ['load'], lambda options: barrier.wait()),
+        Stage('sync', "Sync", ['load'], lambda options: barrier.wait()),
+        Stage('report', "Report", ['match', 'sync'], lambda options: ran.append('report')),
+    ]
+    assert [[stage.name for stage in level] for level in stage_levels(stages)] == \
+        [['load'], ['match', 'sync'], ['report']]
+    assert run_pipeline({}, stages, state_path=tmp_path / 'state.json')
+    assert ran == ['load', 'report']
+    assert {name: record['status'] for name, record in load_state(tmp_path / 'state.json').items()} == \
+        dict.fromkeys(['load', 'match', 'sync', 'report'], 'completed')
+
+def test_resume_reruns_only_the_failed_stage(tmp_path):
+    state_path = tmp_path / 'state.json'
+    ran = []
+    fail = {'sync'}
+
+    def run(name):
+        def stage(options):
+            ran.append(name)
+            if name in fail:
+                raise RuntimeError(f"{name} broke")
+        return stage
+
+    stages = [Stage('load', "Load", [], run('load')),
+              Stage('match', "Match", ['load'], run('match')),
+              Stage('sync', "Sync", ['load'], run('sync')),
+              Stage('report', "Report", ['match', 'sync'], run('report'))]
+    assert not run_pipeline({}, stages, state_path=state_path)
+    assert sorted(ran) == ['load', 'match', 'sync']
+    assert load_state(state_path)['sync']['error'] == "RuntimeError: sync broke"
+
+    fail.clear()
+    ran.clear()
+    assert run_pipeline({}, stages, resume=True, state_path=state_path)
+    assert ran == ['sync', 'report']
@@ -0,0 +1,44 @@
+import pytest
+
+from quality import CHECKS, digit_count
+from transformation import GOLDEN_ROW_FIELDS, QUALITY
+
+@pytest.mark.parametrize('value', [None, '', '+31 6 1234 5678', '(020) 555-01', 'abc', '0031612345678'])
+def test_sql_digit_count_matches_python(mdm_conn, value):
+    sql = CHECKS['min_digits'][1].format(field='?', arg=10)
+    assert mdm_conn.execute(f"SELECT {sql}", (value,) * sql.count('?')).fetchone()[0] == (digit_count(value) >= 10)
+
+def scanned_report(conn):
+    """Reference report: score every active golden record in Python"""
+    report = QUALITY.new_report()
+    QUALITY.score_batch(conn.execute(f"SELECT {', '.join(GOLDEN_ROW_FIELDS)} FROM golden_records "
+                                     "WHERE is_active = 1").fetchall(), report)
+    return report.to_dict()
+
+def test_summary_follows_every_write(mdm_conn):
+    with mdm_conn:
+        mdm_conn.executemany('''INSERT INTO golden_records (golden_id, first_name, last_name, email, phone, address, city)
+                                VALUES (?, 'Jan', 'Jansen', ?, ?, ?, ?)''',
+                             [(i, f"jan{i}@example.com", '+31612345678' if i % 2 else '123',
+                               'Straat 1' if i % 3 else None, 'Utrecht' if i % 5 else '') for i in range(1, 31)])
+    assert QUALITY.summary_report(mdm_conn).to_dict() == scanned_report(mdm_conn)
+    with mdm_conn:
+        mdm_conn.execute("UPDATE golden_records SET phone = '+31 6 87654321' WHERE golden_id <= 10")
+        mdm_conn.execute("UPDATE golden_records SET is_active = 0 WHERE golden_id BETWEEN 11 AND 15")
+        mdm_conn.execute("UPDATE golden_records SET is_active = 1, city = NULL WHERE golden_id = 12")
+        mdm_conn.execute("DELETE FROM golden_records WHERE golden_id > 25")
+        # Columns the rules do not read leave the counts alone
+        mdm_conn.execute("UPDATE golden_records SET first_name = 'Johannes'")
+    report = QUALITY.summary_report(mdm_conn)
+    assert report.to_dict() == scanned_report(mdm_conn)
+    assert report.records == 21
+
+def test_create_summary_rebuilds_counts(mdm_conn):
+    with mdm_conn:
+        mdm_conn.execute("INSERT INTO golden_records (first_name, last_name, email) VALUES ('A', 'B', 'a@example.com')")
+        QUALITY.drop_summary_triggers(mdm_conn)
+        mdm_conn.execute("INSERT INTO golden_records (first_name, last_name, email) VALUES ('C', 'D', 'c@example.com')")
+    assert QUALITY.summary_report(mdm_conn).records == 1
+    with mdm_conn:
+        QUALITY.create_summary(mdm_conn)
+    assert QUALITY.summary_report(mdm_conn).to_dict() == scanned_report(mdm_conn)
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from scorers import SCORERS, get_scorer, jaro_winkler, levenshtein_distance, levenshtein_ratio, token_set_ratio
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('kitten', 'sitting', 3),
+    ('flaw', 'lawn', 2),
+    ('', 'abc', 3),
+    ('jansen', 'jansen', 0),
+])
+def test_levenshtein_distance(a, b, expected):
+    assert levenshtein_distance(a, b) == expected
+    assert levenshtein_distance(b, a) == expected
+
+def test_levenshtein_distance_stops_past_max_distance():
+    assert levenshtein_distance('kitten', 'sitting', max_distance=1) == 2
+    assert levenshtein_distance('abcdef', 'a', max_distance=2) == 3
+
+def test_levenshtein_ratio():
+    assert levenshtein_ratio('Jansen', 'jansen') == 1.0
+    assert levenshtein_ratio('kitten', 'sitting') == pytest.approx(4 / 7)
+    assert levenshtein_ratio('', '') == 1.0
+    # Below the cutoff the kernel gives up and reports 0.0
+    assert levenshtein_ratio('kitten', 'sitting', cutoff=0.9) == 0.0
+
+@pytest.mark.parametrize('a, b', [('cbcea', 'cbea'), ('abcdefghij', 'abcdefghXY'), ('abcde', 'abcXY')])
+def test_levenshtein_ratio_exactly_at_cutoff(a, b):
+    expected = levenshtein_ratio(a, b)
+    assert levenshtein_ratio(a, b, cutoff=expected) == expected
+    assert levenshtein_ratio(a, b, cutoff=expected + 0.01) == 0.0
+
+def test_levenshtein_ratio_cutoff_never_drops_a_passing_pair():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randint(1, 12)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randint(1, 12)))
+        cutoff = rng.choice([0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9])
+        ratio = levenshtein_ratio(a, b)
+        assert levenshtein_ratio(a, b, cutoff) == (ratio if ratio >= cutoff - 1e-9 else 0.0)
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('MARTHA', 'MARHTA', 0.9611),
+    ('DWAYNE', 'DUANE', 0.84),
+    ('DIXON', 'DICKSONX', 0.8133),
+])
+def test_jaro_winkler_reference_values(a, b, expected):
+    assert jaro_winkler(a, b) == pytest.approx(expected, abs=1e-4)
+
+def test_jaro_winkler_edge_cases():
+    assert jaro_winkler('de Vries', 'DE VRIES') == 1.0
+    assert jaro_winkler('', 'abc') == 0.0
+    assert jaro_winkler('abc', 'xyz') == 0.0
+
+def test_token_set_ratio_ignores_word_order():
+    assert token_set_ratio('van der Berg', 'Berg, van der') == 1.0
+
+@pytest.mark.parametrize('name', sorted(SCORERS))
+def test_batch_scorers_match_single_pairs(name):
+    pairs = [('Jan', 'Jan'), ('Pieter', 'Peter'), ('Bakker', 'Visser')]
+    scores = get_scorer(name)(pairs)
+    assert len(scores) == len(pairs)
+    assert scores[0] == pytest.approx(1.0)
+    assert all(0.0 <= score <= 1.0 for score in scores)
+    assert scores[1] > scores[2]
+
+def test_unknown_scorer():
+    with pytest.raises(ValueError, match="Unknown scorer"):
+        get_scorer('soundex')
@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from setup_databases import create_databases
+from transformation import transform_source_to_mdm
+
+CRM_ROWS = [(f"first{i}", f"LAST{i % 17}", f" Customer{i}@Example.com ",
+             f"+31 6 {i:08d}" if i % 5 else "123", 18 + i % 70,
+             f"Straat {i}" if i % 7 else None, "Amsterdam" if i % 3 else "", "Netherlands")
+            for i in range(1, 301)]
+
+def golden_rows(directory):
+    conn = sqlite3.connect(directory / 'mdm.db')
+    rows = conn.execute('''SELECT source_id, first_name, last_name, email, phone, age, address, city,
+                                  confidence_score, data_quality_score
+                           FROM golden_records ORDER BY source_id''').fetchall()
+    conn.close()
+    return rows
+
+def run_transformation(directory, monkeypatch, **options):
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    create_databases()
+    conn = sqlite3.connect('source-systems.db')
+    with conn:
+        conn.executemany('''INSERT INTO crm_customers (first_name, last_name, email, phone, age, address, city, country)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', CRM_ROWS)
+    conn.close()
+    transform_source_to_mdm(batch_size=40, **options)
+    return golden_rows(directory)
+
+@pytest.fixture
+def serial_rows(tmp_path, monkeypatch):
+    return run_transformation(tmp_path / 'serial', monkeypatch, workers=1)
+
+def test_serial_transform(serial_rows):
+    assert len(serial_rows) == len(CRM_ROWS)
+    source_id, first_name, last_name, email = serial_rows[0][:4]
+    assert (source_id, first_name, last_name, email) == (1, 'First1', 'Last1', 'customer1@example.com')
+    # Every fifth phone is too short, every third city is missing
+    scores = {row[0]: row[-1] for row in serial_rows}
+    assert scores[5] == 90 and scores[3] == 90 and scores[15] == 80 and scores[1] == 100
+
+def test_parallel_transform_matches_serial(serial_rows, tmp_path, monkeypatch):
+    assert run_transformation(tmp_path / 'parallel', monkeypatch, workers=2) == serial_rows
+
+def test_sql_transform_matches_serial(serial_rows, tmp_path, monkeypatch):
+    assert run_transformation(tmp_path / 'sql', monkeypatch, engine='sql') == serial_rows